@@ -0,0 +1,204 @@
+# answer_cache.py
+# Semantic answer cache in front of the RAG tool. Questions are embedded and compared
+# (cosine similarity) with earlier questions on the same collection; a close enough match
+# returns the stored answer without calling the LLM. Bounded by TTL, per-collection LRU and
+# a cap on collections, and persisted to disk so it survives restarts: new answers are
+# appended to a JSONL log by a background thread, which also compacts the log now and then.
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import ANSWER_CACHE_MAX_COLLECTIONS, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_PATH, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL_S
+
+COMPACT_MIN_LINES = 1000 # The log is rewritten once it has this many lines and twice the live entries
+
+# Words that make a follow-up question depend on earlier turns ("what about its price?")
+REFERENTIAL_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their", "he", "she", "him", "her", "his",
+    "above", "previous", "earlier", "same", "again", "former", "latter", "more", "else", "also",
+}
+
+
+def is_context_dependent(question: str, chat_history: Optional[list]) -> bool:
+    """
+    True when the question only makes sense together with the chat history,
+    in which case a cached answer to the same words may be wrong.
+    """
+    if not chat_history:
+        return False
+    words = re.findall(r"[a-z']+", question.lower())
+    return len(words) < 4 or any(word in REFERENTIAL_WORDS for word in words)
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        path: str = ANSWER_CACHE_PATH,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_s: float = ANSWER_CACHE_TTL_S,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        max_collections: int = ANSWER_CACHE_MAX_COLLECTIONS,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries # Per collection
+        self.max_collections = max_collections
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._collections: "OrderedDict[str, OrderedDict[str, dict]]" = OrderedDict() # Least recently used first
+        self._matrices: Dict[str, np.ndarray] = {} # Normalized question embeddings, rebuilt lazily
+        self._log_lines = 0
+        self._pending: "queue.Queue[dict]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._load()
+
+    def _load(self) -> None:
+        # Replays the log; later lines win, and the same bounds as put() apply
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError: # Torn last line after a crash
+                        continue
+                    self._log_lines += 1
+                    self._insert(entry)
+        except OSError:
+            return
+        for collection_name in list(self._collections):
+            self._expire(collection_name)
+        logging.info(f"Answer cache: loaded {sum(len(v) for v in self._collections.values())} entries from '{self.path}'.")
+
+    def _insert(self, entry: dict) -> None:
+        # Adds an entry as most recently used and applies the LRU bounds. Call with _lock held.
+        collection_name = entry["collection"]
+        entries = self._collections.setdefault(collection_name, OrderedDict())
+        self._collections.move_to_end(collection_name)
+        entries.pop(entry["question"], None)
+        entries[entry["question"]] = entry
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        while len(self._collections) > self.max_collections:
+            evicted, _ = self._collections.popitem(last=False)
+            self._matrices.pop(evicted, None)
+        self._matrices.pop(collection_name, None)
+
+    # --- Background persistence ---
+
+    def _write_loop(self) -> None:
+        while True:
+            entries = [self._pending.get()]
+            while not self._pending.empty(): # Append everything queued in one write
+                entries.append(self._pending.get_nowait())
+            try:
+                self._append(entries)
+                if self._log_lines >= COMPACT_MIN_LINES and self._log_lines > 2 * len(self):
+                    self._compact()
+            except OSError as e:
+                logging.warning(f"Answer cache: could not persist to '{self.path}': {e}")
+            finally:
+                for _ in entries:
+                    self._pending.task_done()
+
+    def _append(self, entries: List[dict]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        self._log_lines += len(entries)
+
+    def _compact(self) -> None:
+        # Only the writer thread touches the file, so nothing is appended while it is replaced.
+        # Entries still queued are in the snapshot and get appended again: harmless duplicates.
+        with self._lock:
+            snapshot = [entry for entries in self._collections.values() for entry in entries.values()]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in snapshot))
+        os.replace(tmp_path, self.path)
+        self._log_lines = len(snapshot)
+        logging.info(f"Answer cache: compacted log to {len(snapshot)} entries.")
+
+    def flush(self) -> None:
+        # Blocks until every answer put so far is on disk
+        self._pending.join()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._collections.values())
+
+    def _expire(self, collection_name: str) -> None:
+        entries = self._collections.get(collection_name)
+        if not entries:
+            return
+        cutoff = time.time() - self.ttl_s
+        expired = [question for question, entry in entries.items() if entry["created_at"] < cutoff]
+        for question in expired:
+            del entries[question]
+        if expired:
+            self._matrices.pop(collection_name, None)
+
+    def _matrix(self, collection_name: str) -> np.ndarray:
+        if collection_name not in self._matrices:
+            vectors = np.asarray([entry["embedding"] for entry in self._collections[collection_name].values()], dtype=np.float32)
+            self._matrices[collection_name] = vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+        return self._matrices[collection_name]
+
+    def lookup(self, collection_name: str, embedding: List[float]) -> Optional[str]:
+        with self._lock:
+            self._expire(collection_name)
+            entries = self._collections.get(collection_name)
+            if not entries:
+                self.misses += 1
+                return None
+
+            query = np.asarray(embedding, dtype=np.float32)
+            query /= max(float(np.linalg.norm(query)), 1e-12)
+            scores = self._matrix(collection_name) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            question = list(entries.keys())[best]
+            entries.move_to_end(question) # LRU: most recently used last
+            self._collections.move_to_end(collection_name)
+            self._matrices.pop(collection_name, None)
+            self.hits += 1
+            logging.info(f"Answer cache hit on '{collection_name}' (similarity {scores[best]:.3f}): '{question}'")
+            return entries[question]["answer"]
+
+    def put(self, collection_name: str, question: str, embedding: List[float], answer: str) -> None:
+        entry = {
+            "collection": collection_name,
+            "question": question,
+            "embedding": [float(value) for value in embedding],
+            "answer": answer,
+            "created_at": time.time(),
+        }
+        with self._lock:
+            self._insert(entry)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="answer-cache-writer", daemon=True)
+                self._writer.start()
+        self._pending.put(entry) # Written by the background thread, off the request path
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": sum(len(entries) for entries in self._collections.values()),
+            }
+
+
+answer_cache = SemanticAnswerCache()
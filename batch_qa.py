@@ -0,0 +1,125 @@
+# batch_qa.py
+# Async batch QA: fans many (file, question) pairs out over graph.ainvoke, with LLM
+# concurrency capped by a semaphore and one shared ingestion per file hash.
+# Results are written as JSONL as they complete.
+#
+#   python batch_qa.py Data/ questions.txt -o results.jsonl -c 8
+#
+# questions.txt: one question per line, asked about every supported file in the directory.
+# questions.jsonl: {"question": ..., "file": optional path relative to the directory} per line.
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from graph_builder import build_graph
+from nodes.upload_node import IMAGE_EXTENSIONS, LOADER_MAP, calculate_file_hash, upload
+
+SUPPORTED_EXTENSIONS = set(LOADER_MAP) | set(IMAGE_EXTENSIONS)
+
+
+class BatchRunner:
+    def __init__(self, concurrency: int = 4):
+        self.graph = build_graph() # No checkpointer: every pair is an independent, one-shot session
+        self.llm_slots = asyncio.Semaphore(concurrency)
+        self._ingestions: Dict[str, asyncio.Task] = {}
+        self._hashes: Dict[str, asyncio.Task] = {}
+
+    async def _file_hash(self, file_path: str) -> str:
+        if file_path not in self._hashes:
+            self._hashes[file_path] = asyncio.ensure_future(asyncio.to_thread(calculate_file_hash, file_path))
+        return await self._hashes[file_path]
+
+    async def ingest(self, file_path: str) -> Dict:
+        """
+        Runs upload() once per content hash; concurrent callers for the same file await the same task.
+        """
+        file_hash = await self._file_hash(file_path)
+        if file_hash not in self._ingestions:
+            self._ingestions[file_hash] = asyncio.ensure_future(asyncio.to_thread(upload, {"file_path": file_path, "file_hash": file_hash})) # Already hashed above
+        return await self._ingestions[file_hash]
+
+    async def ask(self, file_path: str, question: str) -> Dict:
+        started = time.perf_counter()
+        record = {"file": file_path, "question": question}
+        try:
+            ingested = await self.ingest(file_path)
+            if ingested.get("upload_error"):
+                # The failed upload is cached with its ingestion task, so it is not retried per question
+                record["error"] = ingested["upload_error"]
+            else:
+                # Same file path + signature in state, so the graph's upload node takes its fast path
+                state = {**ingested, "file_path": file_path, "input": question, "chat_history": []}
+                async with self.llm_slots:
+                    result = await self.graph.ainvoke(state)
+                record["answer"] = result.get("answer")
+        except Exception as e:
+            logging.error(f"Batch QA failed for '{file_path}': {e}")
+            record["error"] = str(e)
+        record["latency_s"] = round(time.perf_counter() - started, 3)
+        return record
+
+    async def run(self, pairs: List[Tuple[str, str]], output_path: Optional[str] = None) -> List[Dict]:
+        started = time.perf_counter()
+        results = []
+        out = open(output_path, "w", encoding="utf-8") if output_path else None
+        try:
+            for next_result in asyncio.as_completed([self.ask(file_path, question) for file_path, question in pairs]):
+                record = await next_result
+                results.append(record)
+                if out is not None:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+        finally:
+            if out is not None:
+                out.close()
+
+        elapsed = time.perf_counter() - started
+        logging.info(
+            f"Batch QA: {len(results)} questions over {len(self._ingestions)} files in {elapsed:.1f}s "
+            f"({len(results) / elapsed if elapsed else 0:.2f} q/s, {sum('error' in r for r in results)} errors)"
+        )
+        return results
+
+
+async def run_batch(pairs: List[Tuple[str, str]], output_path: Optional[str] = None, concurrency: int = 4) -> List[Dict]:
+    return await BatchRunner(concurrency).run(pairs, output_path)
+
+
+def collect_files(directory: str) -> List[str]:
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                files.append(os.path.join(root, name))
+    return files
+
+
+def load_pairs(directory: str, questions_path: str) -> List[Tuple[str, str]]:
+    files = collect_files(directory)
+    pairs = []
+    with open(questions_path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+
+    if questions_path.endswith(".jsonl"):
+        for line in lines:
+            item = json.loads(line)
+            targets = [os.path.join(directory, item["file"])] if item.get("file") else files
+            pairs.extend((file_path, item["question"]) for file_path in targets)
+    else:
+        pairs = [(file_path, question) for file_path in files for question in lines]
+    return pairs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer many questions over many files concurrently.")
+    parser.add_argument("directory", help="Directory of documents/images/spreadsheets, e.g. Data/")
+    parser.add_argument("questions", help="Questions file (.txt: one per line, .jsonl: {question, file})")
+    parser.add_argument("-o", "--output", default="results.jsonl")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Max concurrent LLM calls")
+    args = parser.parse_args()
+
+    asyncio.run(run_batch(load_pairs(args.directory, args.questions), args.output, args.concurrency))
@@ -0,0 +1,334 @@
+# benchmarks/bench_e2e.py
+# Offline end-to-end benchmark: ingestion, retrieval and full graph invocation over Data/
+# plus synthetic large PDFs/CSVs. Groq and the MiniLM model are replaced by the fakes in
+# benchmarks/fakes.py (hashing embedder, chat model with configurable latency), so this
+# runs in CI and on air-gapped machines. Everything is written to a temporary working dir.
+#
+#   python benchmarks/bench_e2e.py -o bench.json
+#   python benchmarks/bench_e2e.py -o new.json --baseline bench.json --tolerance 0.2
+#
+# With --baseline, exits with status 1 when a latency, throughput or peak-RSS figure is
+# worse than the baseline by more than --tolerance.
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_index_layout import percentiles, rss_mb # noqa: E402
+
+DOCUMENT_EXTENSIONS = {".pdf", ".txt", ".docx", ".md", ".csv", ".xlsx"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "mean_ms", "peak_rss_mb")
+HIGHER_IS_BETTER = ("files_per_s", "chunks_per_s", "pages_per_s", "queries_per_s")
+
+
+class RSSSampler:
+    """
+    Samples this process's RSS every `interval_s` from a background thread; `peak_mb` is the
+    highest value seen while the block ran.
+    """
+
+    def __init__(self, interval_s: float = 0.005):
+        self.interval_s = interval_s
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, rss_mb())
+            self._stop.wait(self.interval_s)
+
+    def __enter__(self):
+        self.peak_mb = rss_mb()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, rss_mb())
+
+
+# --- Synthetic inputs ---
+
+def _vocabulary(rng: random.Random, size: int = 3000) -> List[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def fact_sentence(item: int) -> str:
+    # Planted facts give the retrieval and graph stages questions with a known answer
+    return f"The access code for item {item} is ZX-{item * 7919 % 100000:05d}."
+
+
+def fact_question(item: int) -> str:
+    return f"What is the access code for item {item}?"
+
+
+def write_pdf(path: str, pages: int, seed: int = 0, lines_per_page: int = 45, words_per_line: int = 12) -> List[int]:
+    """
+    Writes a plain-text PDF (Helvetica, one content stream per page) without any PDF library.
+    Returns the item numbers of the planted facts (one per page).
+    """
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    page_ids, items = [], []
+    for page in range(pages):
+        lines = [" ".join(rng.choice(vocabulary) for _ in range(words_per_line)) for _ in range(lines_per_page)]
+        items.append(page + 1)
+        lines[rng.randrange(lines_per_page)] = fact_sentence(page + 1)
+        text_ops = " ".join(f"({line}) Tj T*" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 50 780 Td {text_ops} ET".encode("latin-1")
+        page_id, content_id = 4 + 2 * page, 5 + 2 * page
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        page_ids.append(page_id)
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{i} 0 R" for i in page_ids).encode(), pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for object_id in sorted(objects):
+            offsets[object_id] = f.tell()
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id]))
+        xref_at = f.tell()
+        count = max(objects) + 1
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % count)
+        for object_id in range(1, count):
+            f.write(b"%010d 00000 n \n" % offsets[object_id])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, xref_at))
+    return items
+
+
+def write_csv(path: str, rows: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    categories = ["alpha", "beta", "gamma", "delta", "epsilon"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "category", "amount", "date"])
+        for row in range(rows):
+            writer.writerow([row, f"customer_{rng.randrange(rows)}", rng.choice(categories), round(rng.uniform(1, 1000), 2), f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"])
+
+
+# --- Stages ---
+
+def stage_ingest(files: List[str]) -> Dict:
+    from ingest_jobs import collection_for
+    from nodes.upload_node import upload
+    from resources import get_ingest_queue
+
+    per_file, samples = [], []
+    started = time.perf_counter()
+    with RSSSampler() as rss:
+        for path in files:
+            file_started = time.perf_counter()
+            state = upload({"file_path": path})
+            seconds = time.perf_counter() - file_started
+            samples.append(seconds * 1000)
+            file_hash = state.get("last_processed_file_hash")
+            job = get_ingest_queue().get(file_hash) if file_hash else None
+            progress = job.progress if job is not None else {"pages": 0, "chunks": 0}
+            per_file.append({
+                "file": os.path.basename(path),
+                "seconds": round(seconds, 3),
+                "pages": progress["pages"],
+                "chunks": progress["chunks"],
+                "collection": collection_for(file_hash) if file_hash else None,
+                "error": state.get("answer") if not file_hash else None,
+            })
+    elapsed = time.perf_counter() - started
+    chunks = sum(entry["chunks"] for entry in per_file)
+    pages = sum(entry["pages"] for entry in per_file)
+    return {
+        "files": len(files),
+        "chunks": chunks,
+        "files_per_s": round(len(files) / elapsed, 3),
+        "chunks_per_s": round(chunks / elapsed, 2),
+        "pages_per_s": round(pages / elapsed, 2),
+        **percentiles(samples),
+        "peak_rss_mb": round(rss.peak_mb, 1),
+        "per_file": per_file,
+    }
+
+
+def stage_retrieval(collections: List[str], questions: List[str]) -> Dict:
+    from resources import get_bm25_index, get_embeddings, get_vectorstore
+    from retrieval import hybrid_search
+
+    samples = []
+    started = time.perf_counter()
+    with RSSSampler() as rss:
+        for collection_name in collections:
+            vectordb = get_vectorstore(collection_name)
+            bm25_index = get_bm25_index(collection_name)
+            for question in questions:
+                query_started = time.perf_counter()
+                hybrid_search(vectordb, question, get_embeddings().embed_query(question), bm25_index)
+                samples.append((time.perf_counter() - query_started) * 1000)
+    elapsed = time.perf_counter() - started
+    return {
+        "queries": len(samples),
+        "queries_per_s": round(len(samples) / elapsed, 2),
+        **percentiles(samples),
+        "peak_rss_mb": round(rss.peak_mb, 1),
+    }
+
+
+def stage_graph(files: List[str], questions: List[str]) -> Dict:
+    from checkpointing import session_config
+    from resources import get_graph
+
+    graph = get_graph()
+    samples, errors = [], 0
+    started = time.perf_counter()
+    with RSSSampler() as rss:
+        for index, path in enumerate(files):
+            # One session per file: the first question pays for upload(), follow-ups take its fast path
+            config = session_config(f"bench-{index}")
+            for question in questions:
+                query_started = time.perf_counter()
+                result = graph.invoke({"input": question, "file_path": path}, config=config)
+                samples.append((time.perf_counter() - query_started) * 1000)
+                errors += str(result.get("answer", "")).startswith(("Error", "⚠️"))
+    elapsed = time.perf_counter() - started
+    return {
+        "invocations": len(samples),
+        "errors": errors,
+        "queries_per_s": round(len(samples) / elapsed, 2),
+        **percentiles(samples),
+        "peak_rss_mb": round(rss.peak_mb, 1),
+    }
+
+
+# --- Baseline comparison ---
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for stage, metrics in current["stages"].items():
+        base = baseline.get("stages", {}).get(stage, {})
+        for key, value in metrics.items():
+            old = base.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            worse = (key in LOWER_IS_BETTER and change > tolerance) or (key in HIGHER_IS_BETTER and change < -tolerance)
+            marker = "REGRESSION" if worse else ""
+            print(f"{stage:>10} {key:<14} {old:>12} -> {value:<12} {change:+.1%} {marker}")
+            if worse:
+                regressions.append(f"{stage}.{key}: {old} -> {value} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark (fake LLM + hashing embedder).")
+    parser.add_argument("--data", default=os.path.join(REPO_ROOT, "Data"))
+    parser.add_argument("--pdf-pages", type=int, default=200, help="Pages of the synthetic PDF (0 = none)")
+    parser.add_argument("--csv-rows", type=int, default=50_000, help="Rows of the synthetic CSV (0 = none)")
+    parser.add_argument("--questions", type=int, default=20, help="Questions per file for retrieval/graph stages")
+    parser.add_argument("--llm-first-token-s", type=float, default=0.2)
+    parser.add_argument("--llm-token-s", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before failing")
+    parser.add_argument("--keep-workdir", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's INFO logging")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.INFO) # Per-question INFO lines would dominate the run time on small inputs
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    data_dir = os.path.abspath(args.data)
+
+    # Every relative path in config.py (Chroma, caches, traces) lands in the scratch directory
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    os.chdir(workdir)
+    try:
+        from embedding_cache import CachedEmbeddings
+        from fakes import FakeChatModel, HashingEmbeddings
+        from resources import registry, set_llm
+
+        registry.put("embeddings", CachedEmbeddings(HashingEmbeddings(), "hashing-384"))
+        set_llm(FakeChatModel(first_token_latency_s=args.llm_first_token_s, token_latency_s=args.llm_token_s))
+
+        files, skipped = [], []
+        for root, _, names in os.walk(data_dir):
+            for name in sorted(names):
+                suffix = os.path.splitext(name)[1].lower()
+                if suffix in DOCUMENT_EXTENSIONS:
+                    files.append(os.path.join(root, name))
+                elif suffix in IMAGE_EXTENSIONS:
+                    skipped.append(name) # Needs a real PaddleOCR engine
+        facts: List[int] = []
+        if args.pdf_pages:
+            facts = write_pdf(os.path.join(workdir, "synthetic.pdf"), args.pdf_pages, seed=args.seed)
+            files.append(os.path.join(workdir, "synthetic.pdf"))
+        if args.csv_rows:
+            write_csv(os.path.join(workdir, "synthetic.csv"), args.csv_rows, seed=args.seed)
+            files.append(os.path.join(workdir, "synthetic.csv"))
+
+        rng = random.Random(args.seed)
+        questions = [fact_question(rng.choice(facts)) if facts else f"What does section {i} say?" for i in range(args.questions)]
+
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "files": [os.path.basename(path) for path in files],
+                "skipped": skipped,
+                "pdf_pages": args.pdf_pages,
+                "csv_rows": args.csv_rows,
+                "questions_per_file": args.questions,
+                "llm_first_token_s": args.llm_first_token_s,
+                "llm_token_s": args.llm_token_s,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "stages": {},
+        }
+
+        report["stages"]["ingest"] = stage_ingest(files)
+        print(f"ingest: { {k: v for k, v in report['stages']['ingest'].items() if k != 'per_file'} }", flush=True)
+        collections = sorted({entry["collection"] for entry in report["stages"]["ingest"]["per_file"] if entry["collection"]})
+        report["stages"]["retrieval"] = stage_retrieval(collections, questions)
+        print(f"retrieval: {report['stages']['retrieval']}", flush=True)
+        report["stages"]["graph"] = stage_graph(files, questions)
+        print(f"graph: {report['stages']['graph']}", flush=True)
+    finally:
+        os.chdir(REPO_ROOT)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {output}")
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
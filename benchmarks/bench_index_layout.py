@@ -0,0 +1,146 @@
+# benchmarks/bench_index_layout.py
+# Compares the two index layouts at scale: one Chroma collection per file ("per_file")
+# versus one shared collection filtered by file_hash metadata ("corpus").
+# Uses random unit vectors, so no embedding model is needed.
+#
+#   python benchmarks/bench_index_layout.py --files 1000 --chunks-per-file 8 -o layout.json
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+DIM = 384 # all-MiniLM-L6-v2
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def disk_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / (1024 * 1024)
+
+
+def percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+    }
+
+
+def random_vectors(rng: np.random.Generator, count: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(layout: str, path: str, files: int, chunks_per_file: int, seed: int) -> float:
+    import chromadb
+    rng = np.random.default_rng(seed)
+    client = chromadb.PersistentClient(path=path)
+    started = time.perf_counter()
+    corpus = client.get_or_create_collection("corpus") if layout == "corpus" else None
+    for file_index in range(files):
+        file_hash = f"{file_index:032x}"
+        ids = [f"{file_hash}-{i}" for i in range(chunks_per_file)]
+        documents = [f"chunk {i} of file {file_index}" for i in range(chunks_per_file)]
+        embeddings = random_vectors(rng, chunks_per_file).tolist()
+        if layout == "corpus":
+            metadatas = [{"file_hash": file_hash, "file_name": f"file_{file_index}.pdf", "page": i, "file_type": "pdf"} for i in range(chunks_per_file)]
+            corpus.add(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+        else:
+            client.get_or_create_collection(f"doc_{file_hash}").add(ids=ids, documents=documents, embeddings=embeddings)
+    return time.perf_counter() - started
+
+
+def measure(layout: str, path: str, files: int, queries: int, seed: int, results) -> None:
+    # Runs in a fresh process so RSS reflects only this layout
+    import chromadb
+    rss_before = rss_mb()
+    client = chromadb.PersistentClient(path=path)
+    rng = np.random.default_rng(seed + 1)
+    picker = random.Random(seed)
+    report = {}
+
+    if layout == "per_file":
+        samples = []
+        for _ in range(queries):
+            file_hash = f"{picker.randrange(files):032x}"
+            started = time.perf_counter()
+            client.get_collection(f"doc_{file_hash}").query(query_embeddings=random_vectors(rng, 1).tolist(), n_results=4)
+            samples.append((time.perf_counter() - started) * 1000)
+        report["query_one_file"] = percentiles(samples)
+    else:
+        corpus = client.get_collection("corpus")
+        for name, scope_size in (("query_one_file", 1), ("query_ten_files", 10), ("query_all_files", None)):
+            samples = []
+            for _ in range(queries):
+                if scope_size is None:
+                    where = None
+                elif scope_size == 1:
+                    where = {"file_hash": f"{picker.randrange(files):032x}"}
+                else:
+                    where = {"file_hash": {"$in": [f"{picker.randrange(files):032x}" for _ in range(scope_size)]}}
+                started = time.perf_counter()
+                corpus.query(query_embeddings=random_vectors(rng, 1).tolist(), n_results=4, where=where)
+                samples.append((time.perf_counter() - started) * 1000)
+            report[name] = percentiles(samples)
+
+    report["rss_mb_after_queries"] = round(rss_mb(), 1)
+    report["rss_mb_delta"] = round(rss_mb() - rss_before, 1)
+    results.put(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-file collections vs one shared corpus collection.")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--chunks-per-file", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_layout_")
+    report = {"files": args.files, "chunks_per_file": args.chunks_per_file, "queries": args.queries, "layouts": {}}
+    try:
+        for layout in ("per_file", "corpus"):
+            path = os.path.join(workdir, layout)
+            build_s = build(layout, path, args.files, args.chunks_per_file, args.seed)
+            # spawn, not fork: the parent already holds a Chroma client and its background threads
+            context = multiprocessing.get_context("spawn")
+            results = context.Queue()
+            process = context.Process(target=measure, args=(layout, path, args.files, args.queries, args.seed, results))
+            process.start()
+            measured = results.get()
+            process.join()
+            report["layouts"][layout] = {"build_s": round(build_s, 2), "disk_mb": round(disk_mb(path), 1), **measured}
+            print(f"{layout}: {report['layouts'][layout]}", flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
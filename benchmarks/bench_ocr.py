@@ -0,0 +1,86 @@
+# benchmarks/bench_ocr.py
+# OCR throughput on a folder of images (default Data/Images), three ways:
+#   baseline  one full-resolution predict() per image, one engine (what vqa_tool used to do)
+#   pipeline  ocr_pipeline.ocr_image(): downsample/tile, all tiles of an image in one batch
+#   pool      ocr_pipeline.ocr_batch(): the pipeline in a process pool, one engine per worker
+# Reports images/s, per-stage timings and lines found. The OCR cache is not used.
+#
+#   python benchmarks/bench_ocr.py Data/Images --repeat 5 --workers 2 -o ocr.json
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import OCR_CONFIG, OCR_WORKERS # noqa: E402
+from nodes.upload_node import IMAGE_EXTENSIONS # noqa: E402
+from ocr_pipeline import ocr_batch, ocr_image # noqa: E402
+
+
+def stage_means(timings):
+    stages = ("preprocess_ms", "ocr_ms", "postprocess_ms")
+    return {stage: round(statistics.fmean(t[stage] for t in timings), 2) for stage in stages if timings and stage in timings[0]}
+
+
+def report(images, elapsed, lines, timings=None):
+    result = {"images": len(images), "elapsed_s": round(elapsed, 3), "images_per_s": round(len(images) / elapsed, 2), "lines": lines}
+    if timings:
+        result["stages"] = stage_means(timings)
+        result["tiles"] = sum(t["tiles"] for t in timings)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the OCR pipeline.")
+    parser.add_argument("directory", nargs="?", default="Data/Images")
+    parser.add_argument("--repeat", type=int, default=3, help="Pass over the images this many times")
+    parser.add_argument("--workers", type=int, default=OCR_WORKERS)
+    parser.add_argument("-o", "--output", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    names = sorted(name for name in os.listdir(args.directory) if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+    images = [os.path.join(args.directory, name) for name in names] * args.repeat
+    if not images:
+        sys.exit(f"No images found in '{args.directory}'.")
+
+    from paddleocr import PaddleOCR
+    started = time.perf_counter()
+    engine = PaddleOCR(**OCR_CONFIG)
+    results = {"engine_load_s": round(time.perf_counter() - started, 2), "workers": args.workers, "modes": {}}
+    engine.predict(images[0]) # Warm-up: first call initializes the predictors
+
+    started = time.perf_counter()
+    lines = 0
+    for path in images:
+        lines += len(engine.predict(path)[0]["rec_texts"])
+    results["modes"]["baseline"] = report(images, time.perf_counter() - started, lines)
+
+    started = time.perf_counter()
+    timings, lines = [], 0
+    for path in images:
+        entry, image_timings = ocr_image(path, engine)
+        timings.append(image_timings)
+        lines += len(entry["rec_texts"])
+    results["modes"]["pipeline"] = report(images, time.perf_counter() - started, lines, timings)
+
+    # Includes starting the workers and loading one engine in each, as a real prewarm run would
+    started = time.perf_counter()
+    batch = ocr_batch(images, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    done = [(entry, image_timings) for entry, image_timings, error in batch.values() if error is None]
+    # ocr_batch returns one result per distinct path; scale to the images actually processed
+    results["modes"]["pool"] = report(images, elapsed, sum(len(entry["rec_texts"]) for entry, _ in done) * args.repeat, [t for _, t in done])
+
+    for mode, result in results["modes"].items():
+        print(f"{mode}: {result}", flush=True)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
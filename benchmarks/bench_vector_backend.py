@@ -0,0 +1,132 @@
+# benchmarks/bench_vector_backend.py
+# Compares the Chroma backend with the flat NumPy store (float32 / float16 / int8) at
+# typical per-file collection sizes: build time, open time, query latency, disk, RSS, and
+# recall@k against exact float32 search. Vectors are synthetic but clustered like real
+# chunk embeddings (chunks of one document are similar), so no embedding model is needed.
+#
+#   python benchmarks/bench_vector_backend.py --sizes 300 2000 20000 -o backends.json
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_index_layout import disk_mb, percentiles, rss_mb # noqa: E402
+
+DIM = 384 # all-MiniLM-L6-v2
+BACKENDS = ("chroma", "flat_float32", "flat_float16", "flat_int8")
+
+
+def clustered_vectors(rng: np.random.Generator, count: int, clusters: int = 32, spread: float = 0.35) -> np.ndarray:
+    centers = rng.standard_normal((clusters, DIM)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + spread * rng.standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(backend: str, path: str, vectors: np.ndarray) -> float:
+    texts = [f"chunk {i}" for i in range(len(vectors))]
+    metadatas = [{"page": i} for i in range(len(vectors))]
+    started = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+        collection = chromadb.PersistentClient(path=path).get_or_create_collection("bench")
+        for start in range(0, len(vectors), 1000): # Chroma caps the batch size
+            end = start + 1000
+            collection.add(ids=[str(i) for i in range(start, min(end, len(vectors)))], documents=texts[start:end], embeddings=vectors[start:end].tolist(), metadatas=metadatas[start:end])
+    else:
+        from flat_store import FlatVectorStore
+        store = FlatVectorStore(path, dtype=backend.split("_", 1)[1])
+        for start in range(0, len(vectors), 64): # Same batch size as upload()
+            store.add_embeddings(texts[start:start + 64], vectors[start:start + 64], metadatas[start:start + 64])
+    return time.perf_counter() - started
+
+
+def measure(backend: str, path: str, queries_path: str, truth_path: str, k: int, results) -> None:
+    # Runs in a fresh process: open time and RSS reflect only this backend
+    if backend == "chroma":
+        import chromadb
+    else:
+        from flat_store import FlatVectorStore
+    queries = np.load(queries_path)
+    truth = np.load(truth_path)
+    rss_before = rss_mb()
+
+    started = time.perf_counter()
+    if backend == "chroma":
+        collection = chromadb.PersistentClient(path=path).get_collection("bench")
+        search = lambda query: [int(i) for i in collection.query(query_embeddings=[query.tolist()], n_results=k)["ids"][0]]
+    else:
+        store = FlatVectorStore(path)
+        search = lambda query: [doc.metadata["page"] for doc in store.similarity_search_by_vector(query, k=k)]
+    open_ms = (time.perf_counter() - started) * 1000
+
+    samples, hits = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found = search(query)
+        samples.append((time.perf_counter() - started) * 1000)
+        hits += len(set(found) & set(expected.tolist()))
+
+    results.put({
+        "open_ms": round(open_ms, 2),
+        "first_query_ms": round(samples[0], 3),
+        **percentiles(samples[1:] or samples),
+        f"recall@{k}": round(hits / truth.size, 4),
+        "rss_mb_delta": round(rss_mb() - rss_before, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Chroma vs the flat NumPy vector store.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[300, 2000, 20000], help="Chunks per collection")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=8, help="Matches RETRIEVAL_K_VECTOR")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="Write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_backend_")
+    report = {"dim": DIM, "queries": args.queries, "k": args.k, "sizes": {}}
+    # spawn, not fork: the parent may already hold a Chroma client and its background threads
+    context = multiprocessing.get_context("spawn")
+    try:
+        for size in args.sizes:
+            rng = np.random.default_rng(args.seed + size)
+            vectors = clustered_vectors(rng, size)
+            # Queries are perturbed chunks, like a question close to one passage
+            queries = vectors[rng.integers(0, size, args.queries)] + 0.5 * clustered_vectors(rng, args.queries)
+            queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+            truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k] # Exact float32 top-k
+            queries_path, truth_path = os.path.join(workdir, "queries.npy"), os.path.join(workdir, "truth.npy")
+            np.save(queries_path, queries)
+            np.save(truth_path, truth)
+
+            report["sizes"][size] = {}
+            for backend in BACKENDS:
+                path = os.path.join(workdir, f"{backend}_{size}")
+                build_s = build(backend, path, vectors)
+                results = context.Queue()
+                process = context.Process(target=measure, args=(backend, path, queries_path, truth_path, args.k, results))
+                process.start()
+                measured = results.get()
+                process.join()
+                report["sizes"][size][backend] = {"build_s": round(build_s, 3), "disk_mb": round(disk_mb(path), 2), **measured}
+                print(f"{size} chunks, {backend}: {report['sizes'][size][backend]}", flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/fakes.py
+# Deterministic stand-ins for the network/model dependencies, so benchmarks run offline:
+# a feature-hashing embedder (no model download) and a chat model with configurable latency.
+import hashlib
+import json
+import time
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from bm25_index import tokenize
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Signed feature hashing of word tokens into `dim` buckets, L2-normalized. The same text
+    always gets the same vector and texts sharing words are similar, which is enough to
+    exercise retrieval realistically without a model.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Answers after `first_token_latency_s`, then streams `completion_tokens` words at
+    `token_latency_s` each, wrapped like a reasoning model (<think>...</think>). Table
+    query prompts get a valid JSON query, so the table tool's fast path is exercised too.
+    """
+
+    first_token_latency_s: float = 0.2
+    token_latency_s: float = 0.005
+    completion_tokens: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency-chat"
+
+    def _respond(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = str(messages[-1].content)
+        if "JSON query over a table" in prompt:
+            return [json.dumps({"filters": [], "operation": "count", "column": None, "group_by": None, "limit": None})]
+        seed = hashlib.md5(prompt.encode("utf-8")).hexdigest()
+        words = ["<think>benchmark", "reasoning</think>"] + [f"w{seed[i % 32]}{i}" for i in range(max(0, self.completion_tokens - 2))]
+        return [word + " " for word in words]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens = self._respond(messages)
+        time.sleep(self.first_token_latency_s + self.token_latency_s * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency_s)
+        for token in self._respond(messages):
+            time.sleep(self.token_latency_s)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
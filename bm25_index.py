@@ -0,0 +1,304 @@
+# bm25_index.py
+# Persisted BM25 inverted index, one per collection, stored next to the Chroma data.
+# Catches exact identifiers, key names, error codes and proper nouns that small
+# embedding models tend to miss.
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from langchain.schema import Document
+
+from config import BM25_INDEX_DIR
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[_\-.][a-z0-9]+)*")
+SCOPE_KEY = "file_hash" # Metadata key corpus queries are scoped by; its doc ids are indexed
+APPEND_MIN_DOCS = 1000 # persist() rewrites the snapshot once the append log holds this many docs and as many as the snapshot
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens. Compound identifiers such as GROQ_API_KEY or ERR-404 are kept
+    whole *and* split into their parts, so both exact and partial matches score.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = re.split(r"[_\-.]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+def matches_filter(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluates the subset of Chroma's `where` syntax the corpus layout uses:
+    {"key": value} and {"key": {"$in": [values]}}, all keys ANDed.
+    """
+    for key, condition in (where or {}).items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class ReadWriteLock:
+    """
+    Many concurrent readers or one writer. Waiting writers block new readers, so a steady
+    stream of searches cannot starve an ingest.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def reading(self) -> Iterator[None]:
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self) -> Iterator[None]:
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class BM25Index:
+    """
+    Safe to search while another thread adds or removes documents (e.g. the shared corpus
+    index during a background ingest): searches and saves read under a shared lock,
+    changes take it exclusively.
+
+    save() writes a full snapshot; persist() only appends the documents added since the last
+    save/persist to a log next to it (<path>.log), so adding one file to a large corpus does
+    not rewrite every chunk's text. load() replays the log on top of the snapshot.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._rw_lock = ReadWriteLock()
+        self.docs: List[Dict] = [] # {"text", "metadata"}
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {} # term -> {doc id: term frequency}
+        self.total_length = 0
+        self._scope_ids: Dict[Any, Set[int]] = {} # file hash -> doc ids, so scoped searches skip other files
+        self._save_lock = threading.Lock()
+        self._persisted_docs = 0 # Docs covered by the snapshot + append log
+        self._logged_docs = 0 # Of which in the append log
+        self._needs_snapshot = True # Set when the files on disk no longer match a prefix of self.docs
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add_documents(self, documents: List[Document]) -> None:
+        with self._rw_lock.writing():
+            self._add(documents)
+
+    def _add(self, documents: List[Document]) -> None:
+        for doc in documents:
+            doc_id = len(self.docs)
+            tokens = tokenize(doc.page_content)
+            self.docs.append({"text": doc.page_content, "metadata": doc.metadata or {}})
+            self._index_scope(doc_id)
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+            for term, frequency in Counter(tokens).items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+
+    def _index_scope(self, doc_id: int) -> None:
+        scope = self.docs[doc_id]["metadata"].get(SCOPE_KEY)
+        if scope is not None:
+            self._scope_ids.setdefault(scope, set()).add(doc_id)
+
+    def _scope_candidates(self, where: Optional[Dict[str, Any]]) -> Optional[Set[int]]:
+        # Doc ids allowed by the SCOPE_KEY condition of `where` (None: not scoped by it)
+        condition = (where or {}).get(SCOPE_KEY)
+        if condition is None:
+            return None
+        if isinstance(condition, dict):
+            if "$in" not in condition:
+                return None
+            return set().union(*(self._scope_ids.get(scope, ()) for scope in condition["$in"]))
+        return self._scope_ids.get(condition, set())
+
+    def remove_where(self, where: Dict[str, Any]) -> int:
+        # Rebuilds the index without the matching chunks; returns how many were removed
+        with self._rw_lock.writing():
+            kept = [doc for doc in self.docs if not matches_filter(doc["metadata"], where)]
+            removed = len(self.docs) - len(kept)
+            if removed:
+                self.docs, self.doc_lengths, self.postings, self.total_length, self._scope_ids = [], [], {}, 0, {}
+                self._needs_snapshot = True
+                self._add([Document(page_content=doc["text"], metadata=doc["metadata"]) for doc in kept])
+        return removed
+
+    def search(self, query: str, k: int = 4, where: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        with self._rw_lock.reading():
+            return self._search(query, k, where)
+
+    def _search(self, query: str, k: int, where: Optional[Dict[str, Any]]) -> List[Tuple[Document, float]]:
+        if not self.docs:
+            return []
+        n_docs = len(self.docs)
+        avg_length = self.total_length / n_docs or 1.0
+        candidates = self._scope_candidates(where)
+        if candidates is not None:
+            if not candidates:
+                return []
+            where = {key: condition for key, condition in where.items() if key != SCOPE_KEY}
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            if candidates is None:
+                matches = postings.items()
+            elif len(candidates) < len(postings):
+                # Walk the scope's own docs instead of every posting in the corpus
+                matches = [(doc_id, postings[doc_id]) for doc_id in candidates if doc_id in postings]
+            else:
+                matches = [(doc_id, frequency) for doc_id, frequency in postings.items() if doc_id in candidates]
+            for doc_id, frequency in matches:
+                if where and not matches_filter(self.docs[doc_id]["metadata"], where):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            (Document(page_content=self.docs[doc_id]["text"], metadata=self.docs[doc_id]["metadata"]), score)
+            for doc_id, score in best
+        ]
+
+    # --- Persistence ---
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with self._save_lock, self._rw_lock.reading():
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "k1": self.k1,
+                    "b": self.b,
+                    "docs": self.docs,
+                    "doc_lengths": self.doc_lengths,
+                    # JSON keys are strings; store postings as [doc id, tf] pairs instead
+                    "postings": {term: list(postings.items()) for term, postings in self.postings.items()},
+                }, f)
+            os.replace(tmp_path, path)
+            if os.path.exists(append_log_path(path)):
+                os.remove(append_log_path(path)) # Now part of the snapshot
+            self._persisted_docs, self._logged_docs, self._needs_snapshot = len(self.docs), 0, False
+
+    def persist(self, path: str) -> None:
+        """
+        Writes the documents added since the last save/persist to the append log. Falls back
+        to a full save() when there is no snapshot yet, documents were removed, or the log has
+        grown as large as the snapshot (so appends stay amortized O(new docs)).
+        """
+        with self._save_lock, self._rw_lock.reading():
+            snapshot_docs = self._persisted_docs - self._logged_docs
+            full = self._needs_snapshot or not os.path.exists(path) or self._logged_docs >= max(APPEND_MIN_DOCS, snapshot_docs)
+            if not full:
+                new_docs = self.docs[self._persisted_docs:]
+                if new_docs:
+                    with open(append_log_path(path), "a", encoding="utf-8") as f:
+                        f.write("".join(json.dumps(doc, ensure_ascii=False) + "\n" for doc in new_docs))
+                    self._persisted_docs += len(new_docs)
+                    self._logged_docs += len(new_docs)
+                return
+        self.save(path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.docs = data["docs"]
+        index.doc_lengths = data["doc_lengths"]
+        index.total_length = sum(index.doc_lengths)
+        index.postings = {term: dict((doc_id, tf) for doc_id, tf in postings) for term, postings in data["postings"].items()}
+        for doc_id in range(len(index.docs)):
+            index._index_scope(doc_id)
+        index._persisted_docs, index._needs_snapshot = len(index.docs), False
+        index._replay(append_log_path(path))
+        return index
+
+    def _replay(self, log_path: str) -> None:
+        # Documents appended by persist(); a torn last line (crash mid-append) forces the next
+        # persist() to write a fresh snapshot instead of appending after it
+        try:
+            with open(log_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        logged = []
+        for line in lines:
+            try:
+                logged.append(json.loads(line))
+            except ValueError:
+                self._needs_snapshot = True
+                break
+        self._add([Document(page_content=doc["text"], metadata=doc["metadata"]) for doc in logged])
+        self._persisted_docs, self._logged_docs = len(self.docs), len(logged)
+
+
+def append_log_path(path: str) -> str:
+    return f"{path}.log"
+
+
+def bm25_index_path(collection_name: str) -> str:
+    return os.path.join(BM25_INDEX_DIR, f"{collection_name}.json")
+
+
+def load_or_build_bm25(collection_name: str, vectordb=None) -> Optional[BM25Index]:
+    """
+    Loads the persisted index for a collection. Collections ingested before BM25 existed
+    get an index built once from the texts already stored in Chroma.
+    """
+    path = bm25_index_path(collection_name)
+    if os.path.exists(path):
+        return BM25Index.load(path)
+    if vectordb is None:
+        return None
+
+    stored = vectordb.get(include=["documents", "metadatas"])
+    index = BM25Index()
+    index.add_documents([
+        Document(page_content=text, metadata=metadata or {})
+        for text, metadata in zip(stored["documents"], stored["metadatas"])
+    ])
+    index.save(path)
+    logging.info(f"BM25: built index for existing collection '{collection_name}' ({len(index)} chunks).")
+    return index
@@ -0,0 +1,156 @@
+# bulk_ingest.py
+# Pre-indexes a whole directory: files are hashed and parsed/split in a process pool,
+# then embedded in large batches in this (parent) process, which owns the embedding model
+# and the Chroma client. Files whose doc_<hash> collection already exists are skipped.
+#
+#   python bulk_ingest.py Data/ --workers 4 --manifest chroma_db_files/manifest.json
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+from bm25_index import BM25Index, bm25_index_path
+from config import CHROMA_DB_PERSIST_DIR, CORPUS_COLLECTION_NAME, FLAT_STORE_DIR, VECTOR_BACKEND
+from corpus_index import corpus_contains, corpus_mode, ingest_into_corpus, save_corpus_lexical_index
+from ingestion import IngestProgress, ingest_documents, iter_chunks, iter_file_documents
+from nodes.upload_node import LOADER_MAP, calculate_file_hash, generate_collection_name
+from resources import drop_vectorstore, finish_vectorstore, get_chroma_client, prepare_vectorstore, registry, vectorstore_exists
+
+BULK_EMBED_BATCH_SIZE = 256
+DEFAULT_MANIFEST_PATH = os.path.join(CHROMA_DB_PERSIST_DIR, "manifest.json")
+
+
+def parse_file(file_path: str) -> Tuple[str, list, int, float]:
+    """
+    Worker: reads and splits one file. Returns (file_path, chunks, pages, seconds).
+    """
+    started = time.perf_counter()
+    suffix = os.path.splitext(file_path)[1].lower()
+    docs, already_chunked = iter_file_documents(file_path, suffix)
+    progress = IngestProgress()
+    if already_chunked:
+        chunks = list(docs)
+        progress.pages = len(chunks)
+    else:
+        chunks = list(iter_chunks(docs, progress))
+    return file_path, chunks, progress.pages, time.perf_counter() - started
+
+
+def collect_documents(directory: str) -> List[str]:
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in LOADER_MAP: # Images have no collection
+                files.append(os.path.join(root, name))
+    return files
+
+
+def existing_collections() -> set:
+    # Completely ingested collections only; partial ones are dropped and ingested again
+    if VECTOR_BACKEND == "flat":
+        names = os.listdir(FLAT_STORE_DIR) if os.path.isdir(FLAT_STORE_DIR) else []
+    else:
+        # Older chromadb returns Collection objects, newer returns names
+        names = [getattr(collection, "name", collection) for collection in get_chroma_client().list_collections()]
+    return {name for name in names if vectorstore_exists(name)}
+
+
+def bulk_ingest(directory: str, workers: int = None, manifest_path: str = DEFAULT_MANIFEST_PATH) -> Dict:
+    started = time.perf_counter()
+    files = collect_documents(directory)
+    manifest: List[Dict] = []
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        hashes = dict(zip(files, pool.map(calculate_file_hash, files)))
+
+        known = existing_collections()
+        to_parse = {}
+        queued_hashes = set()
+        for file_path in files:
+            file_hash = hashes[file_path]
+            if corpus_mode():
+                collection_name = CORPUS_COLLECTION_NAME
+                already_indexed = file_hash in queued_hashes or corpus_contains(file_hash)
+            else:
+                collection_name = generate_collection_name(file_path, file_hash)
+                already_indexed = file_hash in queued_hashes or collection_name in known
+            if already_indexed:
+                manifest.append({"file": file_path, "hash": hashes[file_path], "collection": collection_name, "status": "skipped"})
+            else:
+                to_parse[file_path] = collection_name
+                queued_hashes.add(file_hash)
+        logging.info(f"Bulk ingest: {len(files)} files found, {len(to_parse)} to ingest, {len(files) - len(to_parse)} already indexed.")
+
+        futures = {pool.submit(parse_file, file_path): file_path for file_path in to_parse}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            collection_name = to_parse[file_path]
+            entry = {"file": file_path, "hash": hashes[file_path], "collection": collection_name}
+            try:
+                _, chunks, pages, parse_s = future.result()
+                if not chunks:
+                    raise ValueError("document is empty")
+
+                # Embedding stays in the parent: one model instance, large batches
+                embed_started = time.perf_counter()
+                if corpus_mode():
+                    # The shared BM25 index is saved once at the end instead of after every file
+                    ingest_into_corpus(chunks, file_path, hashes[file_path], split=False, batch_size=BULK_EMBED_BATCH_SIZE, save_lexical_index=False)
+                else:
+                    lexical_index = BM25Index()
+                    vectordb = prepare_vectorstore(collection_name)
+                    ingest_documents(chunks, vectordb, batch_size=BULK_EMBED_BATCH_SIZE, split=False, lexical_index=lexical_index)
+                    finish_vectorstore(collection_name, vectordb)
+                    lexical_index.save(bm25_index_path(collection_name))
+                    registry.put(f"bm25:{collection_name}", lexical_index)
+
+                entry.update({
+                    "status": "ingested",
+                    "pages": pages,
+                    "chunks": len(chunks),
+                    "parse_s": round(parse_s, 3),
+                    "embed_s": round(time.perf_counter() - embed_started, 3),
+                })
+            except Exception as e:
+                logging.error(f"Bulk ingest failed for '{file_path}': {e}")
+                if not corpus_mode(): # The corpus removes a failed file's chunks itself
+                    drop_vectorstore(collection_name)
+                entry.update({"status": "failed", "error": str(e)})
+            manifest.append(entry)
+
+    if corpus_mode():
+        save_corpus_lexical_index()
+
+    elapsed = time.perf_counter() - started
+    ingested = [entry for entry in manifest if entry["status"] == "ingested"]
+    total_chunks = sum(entry["chunks"] for entry in ingested)
+    summary = {
+        "files": len(files),
+        "ingested": len(ingested),
+        "skipped": sum(entry["status"] == "skipped" for entry in manifest),
+        "failed": sum(entry["status"] == "failed" for entry in manifest),
+        "chunks": total_chunks,
+        "pages": sum(entry["pages"] for entry in ingested),
+        "elapsed_s": round(elapsed, 3),
+        "files_per_s": round(len(ingested) / elapsed, 2) if elapsed else 0.0,
+        "chunks_per_s": round(total_chunks / elapsed, 2) if elapsed else 0.0,
+    }
+
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"summary": summary, "files": manifest}, f, indent=2)
+    logging.info(f"Bulk ingest summary: {summary}. Manifest written to '{manifest_path}'.")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-index every document in a directory.")
+    parser.add_argument("directory", nargs="?", default="Data")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH)
+    args = parser.parse_args()
+
+    print(json.dumps(bulk_ingest(args.directory, args.workers, args.manifest), indent=2))
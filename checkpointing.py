@@ -0,0 +1,44 @@
+# checkpointing.py
+# Checkpointers that keep each session's GraphState between questions, so follow-ups
+# on the same file take the fast path in upload() instead of re-ingesting.
+import logging
+import os
+import sqlite3
+
+from config import CHROMA_DB_PERSIST_DIR
+
+# "memory" keeps sessions inside this process; "sqlite" shares them between workers
+CHECKPOINTER_KIND = os.getenv("RAG_CHECKPOINTER", "memory")
+SQLITE_CHECKPOINT_PATH = os.getenv("RAG_CHECKPOINT_DB", os.path.join(CHROMA_DB_PERSIST_DIR, "checkpoints.sqlite"))
+
+
+def create_checkpointer(kind: str = None, sqlite_path: str = None):
+    """
+    Builds the LangGraph checkpointer selected by `kind` ("memory", "sqlite" or "none").
+    """
+    kind = (kind or CHECKPOINTER_KIND).lower()
+
+    if kind == "none":
+        return None
+
+    if kind == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+        logging.info("Checkpointing: using in-memory session store.")
+        return MemorySaver()
+
+    if kind == "sqlite":
+        # Requires the langgraph-checkpoint-sqlite package
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        sqlite_path = sqlite_path or SQLITE_CHECKPOINT_PATH
+        os.makedirs(os.path.dirname(sqlite_path) or ".", exist_ok=True)
+        # Streamlit serves sessions from several threads, so the connection must be shareable
+        conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+        logging.info(f"Checkpointing: using SQLite session store at '{sqlite_path}'.")
+        return SqliteSaver(conn)
+
+    raise ValueError(f"Unknown checkpointer kind: {kind}")
+
+
+def session_config(thread_id: str, **configurable) -> dict:
+    # LangGraph looks sessions up by thread_id; extra keys (e.g. progress_callback) are passed to nodes
+    return {"configurable": {"thread_id": thread_id, **configurable}}
@@ -0,0 +1,88 @@
+# config.py
+# Shared settings used across nodes and tools.
+import os
+
+CHROMA_DB_PERSIST_DIR = "./chroma_db_files" # Base directory for all file-specific collections
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+LLM_MODEL_NAME = "deepseek-r1-distill-llama-70b"
+
+# OCR settings; also part of the OCR cache key so a config change never serves stale text
+OCR_CONFIG = {"use_angle_cls": True, "lang": "en"}
+OCR_CACHE_DIR = "./ocr_cache" # Sits next to chroma_db_files
+OCR_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Chunk-level embedding cache (memory-mapped vectors + key index, one pair of files per model)
+EMBEDDING_CACHE_DIR = "./embedding_cache"
+EMBEDDING_CACHE_DTYPE = "float16" # "float32" keeps exact vectors at twice the size
+
+# Columnar (Parquet) copies of CSV/XLSX files for the structured table tool, keyed by content hash
+TABLE_CACHE_DIR = "./table_cache"
+
+# Semantic answer cache in front of the RAG tool
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_PATH = "./answer_cache/answers.jsonl" # Append-only log, compacted in the background
+ANSWER_CACHE_THRESHOLD = 0.95 # Cosine similarity needed to reuse an earlier answer
+ANSWER_CACHE_TTL_S = 24 * 60 * 60
+ANSWER_CACHE_MAX_ENTRIES = 256 # Per collection
+ANSWER_CACHE_MAX_COLLECTIONS = 64 # Least recently used collections are dropped first
+
+# Token budget for the RAG prompt (retrieved context + chat history)
+CONTEXT_TOKEN_BUDGET = 3000
+HISTORY_MAX_RECENT_TURNS = 3 # Turns kept verbatim; older ones go into the running summary
+HISTORY_SUMMARY_MAX_TOKENS = 300
+
+# Hybrid retrieval (vector + BM25, fused with reciprocal rank fusion)
+BM25_INDEX_DIR = "./chroma_db_files/bm25" # One index per doc_<hash> collection
+RETRIEVAL_K_VECTOR = 8
+RETRIEVAL_K_LEXICAL = 8
+RETRIEVAL_K_FINAL = 4 # Chunks actually sent to the LLM
+RRF_K = 60
+
+# Index layout: "per_file" = one doc_<hash> collection per file (default),
+# "corpus" = one shared collection, chunks tagged with file_hash/file_name/page/file_type metadata
+INDEX_LAYOUT = os.getenv("RAG_INDEX_LAYOUT", "per_file")
+CORPUS_COLLECTION_NAME = "corpus"
+
+# Vector store backend for per-file collections: "chroma" (default) or "flat", a memory-mapped
+# NumPy store with brute-force search (see flat_store.py). The shared corpus always uses Chroma.
+VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "chroma")
+FLAT_STORE_DIR = "./chroma_db_files/flat"
+FLAT_STORE_DTYPE = os.getenv("RAG_FLAT_STORE_DTYPE", "float16") # "float32", "float16" or "int8" (+ per-row scale)
+
+# Per-file resources kept warm in the process registry (resources.py); least recently used are dropped
+REGISTRY_MAX_VECTORSTORES = 64 # Store wrappers are light; Chroma data stays on disk
+REGISTRY_MAX_BM25_INDEXES = 32 # Each holds its file's full chunk text and postings
+REGISTRY_MAX_TABLES = 8 # Whole DataFrames (table_tool.py)
+
+# Background ingestion (ingest_jobs.py): uploads are indexed by a worker pool, one job per content hash
+INGEST_WORKERS = 2
+INGEST_MAX_FINISHED_JOBS = 100 # Finished jobs kept for status polling
+
+# OCR pre-processing (ocr_pipeline.py): oversized images are downsampled, elongated ones
+# (long screenshots, scanned strips) are cut into overlapping tiles along the long side
+OCR_MAX_SIDE = 1600 # px; longer side of a normal image, shorter side of an elongated one
+OCR_TILE_ASPECT = 2.0 # long/short side ratio above which an image is tiled
+OCR_TILE_OVERLAP = 120 # px shared by neighbouring tiles, so no text line is cut in half
+OCR_WORKERS = 2 # Processes (one PaddleOCR engine each) for batch OCR
+OCR_MIN_SCORE = 0.5 # Recognized lines below this confidence are dropped
+
+# Text-heavy images: OCR lines are indexed into an ocr_<hash> collection and only the
+# lines relevant to the question are sent to the LLM
+OCR_INLINE_TOKEN_BUDGET = 1500 # Up to this many tokens of OCR text go into the prompt as-is
+OCR_LINES_PER_CHUNK = 3
+OCR_RETRIEVAL_K = 8 # Line groups sent to the LLM
+
+# Per-node tracing (tracing.py): JSONL traces + Prometheus text metrics. Off by default.
+TRACING_ENABLED = os.getenv("RAG_TRACING", "0") == "1"
+TRACE_PATH = os.getenv("RAG_TRACE_PATH", "./traces/traces.jsonl")
+TRACE_BUFFER_SIZE = 500 # Recent node records kept in memory for the UI timing panel
+METRICS_PORT = int(os.getenv("RAG_METRICS_PORT", "0")) # Serves /metrics when tracing is on; 0 = no endpoint
+
+# File content hash: names doc_<hash> collections and keys every cache, so changing it re-indexes everything.
+# "md5" (default), "sha1"/"sha256" (faster on CPUs with SHA extensions), "blake2b", or "xxh3" (needs `xxhash`)
+FILE_HASH_ALGORITHM = os.getenv("RAG_FILE_HASH", "md5")
+HASH_BUFFER_SIZE = 1024 * 1024 # Bytes per read when hashing or copying files
+
+# Uploads from the UI (upload_store.py): one copy per content hash, least-recently-used removed past the limit
+UPLOAD_STORE_DIR = "./uploads"
+UPLOAD_STORE_MAX_BYTES = int(os.getenv("RAG_UPLOAD_STORE_MAX_MB", "2048")) * 1024 * 1024
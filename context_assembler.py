@@ -0,0 +1,188 @@
+# context_assembler.py
+# Token-budgeted prompt assembly for the RAG tool. Fits retrieved chunks and chat history
+# into a fixed budget: overlapping chunks are merged, <think> reasoning is stripped from
+# stored turns, and turns that no longer fit are rolled into a short running summary.
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from langchain.schema.messages import AIMessage, BaseMessage, HumanMessage
+
+from config import CONTEXT_TOKEN_BUDGET, HISTORY_MAX_RECENT_TURNS, HISTORY_SUMMARY_MAX_TOKENS
+
+CONTEXT_SHARE = 0.7 # Fraction of the budget reserved for retrieved documents
+MIN_CHUNK_OVERLAP = 20 # Shorter shared text is treated as coincidence, not splitter overlap
+MAX_CHUNK_OVERLAP = 300
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception: # tiktoken is optional; fall back to the usual ~4 chars/token estimate
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def strip_reasoning(text: str) -> str:
+    return re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL).strip()
+
+
+def _overlap(left: str, right: str) -> int:
+    # Length of the longest suffix of `left` that is also a prefix of `right`
+    for length in range(min(len(left), len(right), MAX_CHUNK_OVERLAP), MIN_CHUNK_OVERLAP - 1, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+def _merge_pair(block: str, text: str) -> Optional[str]:
+    # The two chunks as one block, or None when they neither contain nor overlap each other
+    if text in block:
+        return block
+    if block in text:
+        return text
+    # When both edges overlap, the longer one is the splitter's; the other is repeated phrasing
+    after, before = _overlap(block, text), _overlap(text, block)
+    if after and after >= before:
+        return block + text[after:]
+    if before:
+        return text + block[before:]
+    return None
+
+
+def merge_chunks(texts: List[str]) -> List[str]:
+    """
+    Merges chunks that are contained in, or overlap the edge of, another chunk
+    (adjacent splitter chunks share up to chunk_overlap characters). A merged block is
+    checked against the other blocks again, so a run of adjacent chunks collapses into
+    one block in any rank order. Blocks keep the rank of their best chunk.
+    """
+    blocks: List[str] = []
+    for text in texts:
+        position = len(blocks)
+        i = 0
+        while i < len(blocks):
+            combined = _merge_pair(blocks[i], text)
+            if combined is None:
+                i += 1
+                continue
+            text = combined
+            del blocks[i]
+            position = min(position, i)
+            i = 0 # The grown block may now bridge blocks that were checked already
+        blocks.insert(min(position, len(blocks)), text)
+    return blocks
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    return text[:max_tokens * 4].rsplit(" ", 1)[0] + " …"
+
+
+def _pair_turns(chat_history: List[BaseMessage]) -> List[List[BaseMessage]]:
+    turns: List[List[BaseMessage]] = []
+    for message in chat_history:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def _summarize_turn(turn: List[BaseMessage]) -> str:
+    # Extractive: the question and the first sentence of the answer
+    question = next((m.content for m in turn if isinstance(m, HumanMessage)), "")
+    answer = strip_reasoning(next((m.content for m in turn if isinstance(m, AIMessage)), ""))
+    first_sentence = re.split(r"(?<=[.!?])\s", answer, maxsplit=1)[0]
+    return f"- Q: {_truncate_to_tokens(question, 40)} A: {_truncate_to_tokens(first_sentence, 60)}"
+
+
+def roll_summary(summary: str, turns: List[List[BaseMessage]]) -> str:
+    lines = [line for line in (summary or "").splitlines() if line]
+    lines.extend(_summarize_turn(turn) for turn in turns)
+    # Oldest lines go first when the summary outgrows its budget
+    while lines and count_tokens("\n".join(lines)) > HISTORY_SUMMARY_MAX_TOKENS:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def assemble_context(
+    query: str,
+    chunk_texts: List[str],
+    chat_history: Optional[List[BaseMessage]] = None,
+    history_summary: str = "",
+    budget: int = CONTEXT_TOKEN_BUDGET,
+) -> Dict[str, Any]:
+    """
+    Returns {"context", "history", "history_summary", "stats"} where `history` holds the
+    recent turns (reasoning stripped) that fit and `history_summary` covers the rest.
+    """
+    chat_history = chat_history or []
+    naive_tokens = (
+        count_tokens("\n\n".join(chunk_texts))
+        + sum(count_tokens(message.content) for message in chat_history)
+        + count_tokens(query)
+    )
+
+    # --- Retrieved context ---
+    context_budget = int(budget * CONTEXT_SHARE)
+    kept_blocks: List[str] = []
+    context_tokens = 0
+    for block in merge_chunks(chunk_texts):
+        block_tokens = count_tokens(block)
+        if context_tokens + block_tokens > context_budget:
+            if not kept_blocks: # Always keep (part of) the best match
+                block = _truncate_to_tokens(block, context_budget)
+                kept_blocks.append(block)
+                context_tokens += count_tokens(block)
+            continue
+        kept_blocks.append(block)
+        context_tokens += block_tokens
+
+    # --- Chat history: newest turns verbatim, older ones rolled into the summary ---
+    remaining = budget - context_tokens - count_tokens(query) - HISTORY_SUMMARY_MAX_TOKENS
+    turns = [
+        [type(message)(content=strip_reasoning(message.content)) if isinstance(message, AIMessage) else message for message in turn]
+        for turn in _pair_turns(chat_history)
+    ]
+    recent: List[List[BaseMessage]] = []
+    for turn in reversed(turns):
+        turn_tokens = sum(count_tokens(message.content) for message in turn)
+        if len(recent) >= HISTORY_MAX_RECENT_TURNS or turn_tokens > remaining:
+            break
+        recent.insert(0, turn)
+        remaining -= turn_tokens
+    older = turns[:len(turns) - len(recent)]
+    summary = roll_summary(history_summary, older) if older else (history_summary or "")
+
+    history = [message for turn in recent for message in turn]
+    prompt_tokens = (
+        context_tokens
+        + sum(count_tokens(message.content) for message in history)
+        + count_tokens(summary)
+        + count_tokens(query)
+    )
+    stats = {
+        "prompt_tokens": prompt_tokens,
+        "naive_tokens": naive_tokens,
+        "saved_tokens": max(0, naive_tokens - prompt_tokens),
+        "chunks_in": len(chunk_texts),
+        "blocks_out": len(kept_blocks),
+        "turns_kept": len(recent),
+        "turns_summarized": len(older),
+    }
+    logging.info(f"Context assembler: {stats}")
+
+    return {
+        "context": "\n\n".join(kept_blocks),
+        "history": history,
+        "history_summary": summary,
+        "stats": stats,
+    }
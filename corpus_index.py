@@ -0,0 +1,118 @@
+# corpus_index.py
+# Optional "corpus" index layout: every chunk of every file goes into one shared Chroma
+# collection (and one BM25 index), tagged with file_hash / file_name / page / file_type.
+# Queries are scoped with metadata filters instead of opening one collection per file.
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from langchain.schema import Document
+
+from bm25_index import bm25_index_path
+from config import CORPUS_COLLECTION_NAME, INDEX_LAYOUT
+from ingestion import EMBED_BATCH_SIZE, IngestProgress, ingest_documents
+from resources import get_bm25_index, get_chroma_client, get_vectorstore
+
+# The shared BM25 index is mutated in place, so writers take turns
+_corpus_lock = threading.Lock()
+
+
+def corpus_mode() -> bool:
+    return INDEX_LAYOUT == "corpus"
+
+
+def scope_filter(file_hashes: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+    """
+    Metadata filter for a query scope: one file, a set of files, or None for the whole corpus ("*").
+    """
+    if not file_hashes or "*" in file_hashes:
+        return None
+    if len(file_hashes) == 1:
+        return {"file_hash": file_hashes[0]}
+    return {"file_hash": {"$in": list(file_hashes)}}
+
+
+def query_scope(state: Dict[str, Any]) -> Optional[List[str]]:
+    # state["search_scope"]: list of file hashes, ["*"] for everything; defaults to the current file
+    return state.get("search_scope") or [state.get("last_processed_file_hash")]
+
+
+def corpus_contains(file_hash: str) -> bool:
+    try:
+        collection = get_chroma_client().get_collection(name=CORPUS_COLLECTION_NAME)
+    except Exception:
+        return False
+    return bool(collection.get(where={"file_hash": file_hash}, limit=1, include=[])["ids"])
+
+
+def tag_documents(documents: Iterable[Document], file_path: str, file_hash: str) -> Iterator[Document]:
+    # Set on pages/rows before splitting; the splitter copies metadata onto every chunk
+    file_name = os.path.basename(file_path)
+    file_type = os.path.splitext(file_path)[1].lower().lstrip(".")
+    for doc in documents:
+        doc.metadata = {
+            **(doc.metadata or {}),
+            "file_hash": file_hash,
+            "file_name": file_name,
+            "file_type": file_type,
+            "page": doc.metadata.get("page", doc.metadata.get("row_start", 0)) if doc.metadata else 0,
+        }
+        yield doc
+
+
+def ingest_into_corpus(
+    documents: Iterable[Document],
+    file_path: str,
+    file_hash: str,
+    split: bool = True,
+    batch_size: int = EMBED_BATCH_SIZE,
+    progress_callback=None,
+    save_lexical_index: bool = True,
+    cancel_event=None,
+) -> IngestProgress:
+    """
+    Adds one file to the shared corpus collection and BM25 index. On failure the file's
+    chunks are removed again so the corpus never holds a partial file.
+    """
+    vectordb = get_vectorstore(CORPUS_COLLECTION_NAME)
+    lexical_index = get_bm25_index(CORPUS_COLLECTION_NAME)
+    try:
+        with _corpus_lock:
+            progress = ingest_documents(
+                tag_documents(documents, file_path, file_hash),
+                vectordb,
+                batch_size=batch_size,
+                progress_callback=progress_callback,
+                split=split,
+                lexical_index=lexical_index,
+                cancel_event=cancel_event,
+            )
+            if save_lexical_index:
+                # Appends only this file's chunks; the corpus snapshot is rewritten now and then
+                lexical_index.persist(bm25_index_path(CORPUS_COLLECTION_NAME))
+    except Exception:
+        remove_file(file_hash)
+        raise
+    return progress
+
+
+def save_corpus_lexical_index() -> None:
+    with _corpus_lock:
+        get_bm25_index(CORPUS_COLLECTION_NAME).persist(bm25_index_path(CORPUS_COLLECTION_NAME))
+
+
+def remove_file(file_hash: str) -> None:
+    """
+    Deletes every chunk of one file from the corpus (vector store and BM25 index).
+    """
+    where = {"file_hash": file_hash}
+    try:
+        get_chroma_client().get_collection(name=CORPUS_COLLECTION_NAME).delete(where=where)
+    except Exception as e:
+        logging.warning(f"Corpus: could not delete chunks of '{file_hash}': {e}")
+    with _corpus_lock:
+        lexical_index = get_bm25_index(CORPUS_COLLECTION_NAME)
+        if lexical_index is not None and lexical_index.remove_where(where):
+            lexical_index.save(bm25_index_path(CORPUS_COLLECTION_NAME))
+    logging.info(f"Corpus: removed file '{file_hash}'.")
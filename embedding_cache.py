@@ -0,0 +1,212 @@
+# embedding_cache.py
+# Persistent chunk-level embedding cache. Vectors live in one append-only, memory-mapped
+# float16/float32 file per model, with a sidecar file of 20-byte SHA-1 keys (one per row).
+# Re-uploading an edited document only sends the chunks whose text changed to the embedder.
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_DTYPE
+from tracing import count
+
+try:
+    import fcntl
+except ImportError: # Windows: no cross-process lock, single writer process only
+    fcntl = None
+
+KEY_SIZE = 20 # SHA-1 digest length
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    # Exclusive advisory lock shared by every process writing the same cache files
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def chunk_key(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Append-only store of (chunk-text hash -> vector) for a single embedding model.
+    Row i of the vectors file belongs to key i of the keys file. Appends take a file lock and
+    number new rows from the committed row count on disk, so several processes (the app,
+    bulk_ingest.py, batch_qa.py) can share one cache; rows appended by others are picked up
+    when the keys file grows.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR, dtype: str = EMBEDDING_CACHE_DTYPE):
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.dtype = np.dtype(dtype)
+        self.vectors_path = os.path.join(cache_dir, f"{slug}.{self.dtype.name}.bin")
+        self.keys_path = os.path.join(cache_dir, f"{slug}.{self.dtype.name}.keys")
+        self.meta_path = os.path.join(cache_dir, f"{slug}.{self.dtype.name}.json")
+        self.lock_path = os.path.join(cache_dir, f"{slug}.{self.dtype.name}.lock")
+        self.dim: Optional[int] = None
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0 # Rows of the files covered by _index (duplicate keys make this > len(_index))
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        with _file_lock(self.lock_path):
+            rows = self._repair()
+            self._read_keys(rows)
+        logging.info(f"Embedding cache: {rows} vectors loaded from '{self.vectors_path}'.")
+
+    def _row_bytes(self) -> int:
+        return self.dim * self.dtype.itemsize
+
+    def _repair(self) -> int:
+        """
+        Returns the committed row count, cutting both files back to it. Vectors are written
+        before keys, so a crash can leave vector rows (or a partial key) without a key; the next
+        append would otherwise number its rows after them and pair keys with the wrong vectors.
+        Call with the file lock held.
+        """
+        key_bytes = os.path.getsize(self.keys_path) if os.path.exists(self.keys_path) else 0
+        vector_bytes = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        rows = min(key_bytes // KEY_SIZE, vector_bytes // self._row_bytes())
+        for path, size, committed in ((self.keys_path, key_bytes, rows * KEY_SIZE), (self.vectors_path, vector_bytes, rows * self._row_bytes())):
+            if size > committed:
+                os.truncate(path, committed)
+                logging.warning(f"Embedding cache: dropped {size - committed} uncommitted bytes from '{path}'.")
+        return rows
+
+    def _read_keys(self, rows: int) -> None:
+        # Indexes the keys of rows [self._rows, rows), i.e. rows appended since the last read
+        known = self._rows
+        if rows <= known:
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(known * KEY_SIZE)
+            raw_keys = f.read((rows - known) * KEY_SIZE)
+        for offset in range(rows - known):
+            self._index.setdefault(raw_keys[offset * KEY_SIZE:(offset + 1) * KEY_SIZE], known + offset)
+        self._rows = rows
+
+    def _refresh(self) -> None:
+        # Picks up rows other processes appended (only complete keys; their vectors are written first)
+        if self.dim is None or not os.path.exists(self.keys_path):
+            return
+        rows = os.path.getsize(self.keys_path) // KEY_SIZE
+        if rows > self._rows:
+            self._read_keys(rows)
+
+    def _mapped(self) -> Optional[np.memmap]:
+        rows = self._rows
+        if rows == 0:
+            return None
+        if self._vectors is None or self._vectors.shape[0] < rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+        return self._vectors
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_many(self, keys: List[bytes]) -> Dict[int, np.ndarray]:
+        # Returns {position in `keys`: vector} for every key that is cached
+        with self._lock:
+            self._refresh()
+            vectors = self._mapped()
+            found = {}
+            for position, key in enumerate(keys):
+                row = self._index.get(key)
+                if row is not None:
+                    found[position] = np.asarray(vectors[row], dtype=np.float32)
+            return found
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        with self._lock, _file_lock(self.lock_path):
+            if self.dim is None:
+                if os.path.exists(self.meta_path): # Created by another process since we loaded
+                    with open(self.meta_path, "r", encoding="utf-8") as f:
+                        self.dim = json.load(f)["dim"]
+                else:
+                    self.dim = int(vectors.shape[1])
+                    with open(self.meta_path, "w", encoding="utf-8") as f:
+                        json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+
+            # Row numbers come from the files, not from what this process has seen
+            start = self._repair()
+            self._read_keys(start)
+            fresh = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._index:
+                    fresh.setdefault(key, vector)
+            if not fresh:
+                return
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.asarray(list(fresh.values()), dtype=self.dtype).tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(fresh))
+
+            for offset, key in enumerate(fresh):
+                self._index[key] = start + offset
+            self._rows = start + len(fresh)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model: document chunks are looked up in the cache first and only
+    misses are embedded. Queries are always embedded fresh.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: Optional[EmbeddingCache] = None):
+        self.embeddings = embeddings
+        self.cache = cache or EmbeddingCache(model_name)
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [chunk_key(text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing = {}
+        for position, key in enumerate(keys):
+            if position not in found:
+                missing.setdefault(key, texts[position])
+
+        if missing:
+            new_vectors = np.asarray(self.embeddings.embed_documents(list(missing.values())), dtype=np.float32)
+            self.cache.put_many(list(missing.keys()), new_vectors)
+            by_key = dict(zip(missing.keys(), new_vectors))
+            for position, key in enumerate(keys):
+                if position not in found:
+                    found[position] = by_key[key]
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        count("embedding_cache_hits", len(texts) - len(missing))
+        count("embedding_cache_misses", len(missing))
+        logging.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} embedded.")
+        return [found[position].tolist() for position in range(len(texts))]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "cached_vectors": len(self.cache)}
@@ -0,0 +1,265 @@
+# flat_store.py
+# Compact in-process vector store for small collections: normalized embeddings in one
+# append-only, memory-mapped file (float32, float16, or int8 with a per-row scale), chunk
+# text/metadata in a JSONL sidecar, and brute-force top-k (one matmul + argpartition).
+# For the few hundred chunks of a typical upload this beats Chroma's client/SQLite/HNSW
+# stack on load time and memory. Exposes the subset of the LangChain vector store API
+# the ingestion and retrieval code uses.
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from bm25_index import matches_filter
+from config import FLAT_STORE_DIR, FLAT_STORE_DTYPE
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+SEARCH_BLOCK_ROWS = 8192
+COMPLETE_MARKER = "complete" # Written once a whole file has been ingested
+
+
+# One lock per directory, shared by every FlatVectorStore opened on it in this process: a
+# store reopened while another instance is still adding (e.g. after a registry eviction)
+# must not cut off rows that are being committed
+_directory_locks: Dict[str, threading.Lock] = {}
+_directory_locks_guard = threading.Lock()
+
+
+def _directory_lock(directory: str) -> threading.Lock:
+    with _directory_locks_guard:
+        return _directory_locks.setdefault(os.path.abspath(directory), threading.Lock())
+
+
+def flat_store_path(collection_name: str) -> str:
+    return os.path.join(FLAT_STORE_DIR, collection_name)
+
+
+def flat_store_exists(collection_name: str) -> bool:
+    # meta.json is committed after every batch; only the marker says the whole file got in
+    return os.path.exists(os.path.join(flat_store_path(collection_name), COMPLETE_MARKER))
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Normalizes rows and converts them to the storage dtype. int8 rows get a scale each
+    (max |value| / 127), so row ≈ int8_row * scale.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+    if dtype != "int8":
+        return vectors.astype(dtype), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+class FlatVectorStore:
+    """
+    One collection in its own directory:
+        vectors.bin  rows of `dtype`, memory-mapped for search
+        scales.bin   float32 per-row scales (int8 only)
+        chunks.jsonl {"text", "metadata"} per row; offsets.bin holds each line's byte offset
+        meta.json    dim, dtype, committed row count and chunks.jsonl size (rewritten after every add)
+        complete     marker written by mark_complete() after the last batch of an ingest
+    Data past the committed count (from an interrupted add) is cut off when the store is opened.
+    Safe to share between threads of one process; only one process should write at a time.
+    """
+
+    def __init__(self, directory: str, embedding_function=None, dtype: str = FLAT_STORE_DTYPE):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported flat store dtype '{dtype}' (expected one of {SUPPORTED_DTYPES})")
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.dtype = dtype
+        self.dim: Optional[int] = None
+        self.count = 0
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._offsets: Optional[np.memmap] = None
+        self._metadatas: Optional[List[Dict[str, Any]]] = None # Loaded only when a filter needs them
+        self._lock = _directory_lock(directory)
+        with self._lock:
+            self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self) -> None:
+        if not os.path.exists(self._path("meta.json")):
+            return
+        with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        # An existing store keeps the dtype it was written with
+        self.dim, self.dtype, self.count = meta["dim"], meta["dtype"], meta["count"]
+        self._vectors = self._scales = self._offsets = None
+        self._truncate(meta.get("chunks_bytes"))
+
+    def _truncate(self, chunks_bytes: Optional[int]) -> None:
+        # The next add appends at the end of each file, so rows past `count` must not survive
+        if chunks_bytes is None: # Stores written before chunks_bytes was recorded: end of the last committed line
+            chunks_bytes = 0
+            if self.count:
+                offsets = np.memmap(self._path("offsets.bin"), dtype=np.int64, mode="r", shape=(self.count,))
+                last_offset = int(offsets[-1])
+                del offsets
+                with open(self._path("chunks.jsonl"), "rb") as f:
+                    f.seek(last_offset)
+                    chunks_bytes = last_offset + len(f.readline())
+        itemsize = np.dtype(self.dtype).itemsize
+        committed = {
+            "vectors.bin": self.count * self.dim * itemsize,
+            "scales.bin": self.count * 4,
+            "offsets.bin": self.count * 8,
+            "chunks.jsonl": chunks_bytes,
+        }
+        for name, size in committed.items():
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                logging.warning(f"Flat store: dropping {os.path.getsize(path) - size} uncommitted bytes from '{path}'.")
+                os.truncate(path, size)
+
+    def _mapped(self) -> Tuple[Optional[np.memmap], Optional[np.memmap]]:
+        if self.count == 0:
+            return None, None
+        if self._vectors is None or self._vectors.shape[0] < self.count:
+            # Rows past `count` (from an interrupted add) are never mapped
+            self._vectors = np.memmap(self._path("vectors.bin"), dtype=self.dtype, mode="r", shape=(self.count, self.dim))
+            self._offsets = np.memmap(self._path("offsets.bin"), dtype=np.int64, mode="r", shape=(self.count,))
+            if self.dtype == "int8":
+                self._scales = np.memmap(self._path("scales.bin"), dtype=np.float32, mode="r", shape=(self.count,))
+        return self._vectors, self._scales
+
+    def __len__(self) -> int:
+        return self.count
+
+    # --- Writing ---
+
+    def add_documents(self, documents: List[Document], **kwargs) -> List[str]:
+        texts = [doc.page_content for doc in documents]
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, [doc.metadata or {} for doc in documents])
+
+    def add_embeddings(self, texts: List[str], vectors, metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        stored, scales = quantize(np.asarray(vectors), self.dtype)
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if self.dim is None:
+                self.dim = int(stored.shape[1])
+
+            chunks_path = self._path("chunks.jsonl")
+            offset = os.path.getsize(chunks_path) if os.path.exists(chunks_path) else 0
+            offsets = []
+            lines = []
+            for text, metadata in zip(texts, metadatas):
+                line = (json.dumps({"text": text, "metadata": metadata}, ensure_ascii=False) + "\n").encode("utf-8")
+                offsets.append(offset)
+                offset += len(line)
+                lines.append(line)
+
+            # Data files first, meta.json last: a crash in between leaves the old count in force
+            with open(self._path("vectors.bin"), "ab") as f:
+                f.write(stored.tobytes())
+            if scales is not None:
+                with open(self._path("scales.bin"), "ab") as f:
+                    f.write(scales.tobytes())
+            with open(chunks_path, "ab") as f:
+                f.write(b"".join(lines))
+            with open(self._path("offsets.bin"), "ab") as f:
+                f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+
+            first_id = self.count
+            self.count += len(texts)
+            tmp_path = self._path("meta.json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype, "count": self.count, "chunks_bytes": offset}, f)
+            os.replace(tmp_path, self._path("meta.json"))
+            if self._metadatas is not None:
+                self._metadatas.extend(metadatas)
+        return [str(row) for row in range(first_id, first_id + len(texts))]
+
+    def mark_complete(self) -> None:
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(COMPLETE_MARKER), "w", encoding="utf-8") as f:
+                f.write(str(self.count))
+
+    # --- Reading ---
+
+    def _read_rows(self, rows: Iterable[int]) -> List[Dict[str, Any]]:
+        records = []
+        with open(self._path("chunks.jsonl"), "rb") as f:
+            for row in rows:
+                f.seek(int(self._offsets[row]))
+                records.append(json.loads(f.readline()))
+        return records
+
+    def _all_records(self) -> List[Dict[str, Any]]:
+        with open(self._path("chunks.jsonl"), "rb") as f:
+            return [json.loads(line) for _, line in zip(range(self.count), f)]
+
+    def _filter_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        if self._metadatas is None:
+            self._metadatas = [record["metadata"] for record in self._all_records()]
+        return np.fromiter((matches_filter(metadata, where) for metadata in self._metadatas[:self.count]), dtype=bool, count=self.count)
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs
+    ) -> List[Tuple[Document, float]]:
+        with self._lock:
+            vectors, scales = self._mapped()
+            if vectors is None:
+                return []
+            query = np.asarray(embedding, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1.0
+
+            # Cosine similarity for every row. float16/int8 rows are upcast a block at a time
+            # (NumPy has no fast half/int8 matmul) so the float32 copy stays small.
+            scores = np.empty(self.count, dtype=np.float32)
+            for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+                block = vectors[start:start + SEARCH_BLOCK_ROWS]
+                scores[start:start + len(block)] = np.asarray(block, dtype=np.float32) @ query
+            if scales is not None:
+                scores *= scales
+            if filter:
+                scores[~self._filter_mask(filter)] = -np.inf
+
+            k = min(k, self.count)
+            top = np.argpartition(-scores, k - 1)[:k] if k < self.count else np.arange(self.count)
+            top = top[np.argsort(-scores[top])]
+            top = top[np.isfinite(scores[top])]
+            records = self._read_rows(top)
+        return [
+            (Document(page_content=record["text"], metadata=record["metadata"]), float(scores[row]))
+            for row, record in zip(top, records)
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, filter=filter)]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k=k, filter=filter)
+
+    def get(self, include: Optional[List[str]] = None, **kwargs) -> Dict[str, List]:
+        # Same shape as Chroma's get(); used to rebuild a missing BM25 index
+        with self._lock:
+            records = self._all_records() if self.count else []
+        return {
+            "ids": [str(row) for row in range(len(records))],
+            "documents": [record["text"] for record in records],
+            "metadatas": [record["metadata"] for record in records],
+        }
+
+
+def open_flat_store(collection_name: str, embedding_function=None) -> FlatVectorStore:
+    store = FlatVectorStore(flat_store_path(collection_name), embedding_function)
+    logging.info(f"Flat store '{collection_name}': {len(store)} chunks ({store.dtype}).")
+    return store
@@ -4,9 +4,11 @@ from dotenv import load_dotenv
 
 from vqa_tool import vqa_tool_node
 from rag_tool import rag_tool_node
+from table_tool import table_tool_node
 from nodes.upload_node import upload
 from nodes.ask_node import ask_node
 from nodes.route_mode_node import route_mode_node # Keep this import
+from tracing import start_metrics_server, traced_node
 # import accelerate
 
 # Load .env variables
@@ -15,29 +17,41 @@ load_dotenv()
 class GraphState(TypedDict):
     input: str
     file_path: str
+    file_hash: Optional[str] # Content hash of file_path if the caller already has it (UploadStore); cleared by upload()
     is_image: bool
+    is_table: Optional[bool]
     documents: Optional[list]
     answer: Optional[str]
-    vectordb: Optional[Any]
+    chat_history: Optional[list]
+    history_summary: Optional[str] # Older turns rolled up by the context assembler
+    context_stats: Optional[dict] # Prompt tokens used/saved on the last RAG turn
+    upload_error: Optional[str] # Set by upload() when the file can't be used; the graph then ends
     __next__: Optional[str] # ADD THIS LINE to GraphState
 
+    # Everything below is kept between questions by the checkpointer, so it must stay serializable
     last_processed_file_path: Optional[str]
     last_processed_file_hash: Optional[str]
+    last_processed_file_signature: Optional[str]
     active_collection_name: Optional[str]
+    search_scope: Optional[list] # Corpus layout only: file hashes to search, ["*"] for all (default: current file)
 
-def build_graph():
+def build_graph(checkpointer: Optional[Any] = None):
     builder = StateGraph(GraphState)
 
-    # Add all nodes
-    builder.add_node("upload", upload)
-    builder.add_node("ask_question", ask_node)
-    builder.add_node("route_mode", route_mode_node) # This is now a regular state-updating node that also provides routing info
-    builder.add_node("rag_tool", rag_tool_node)
-    builder.add_node("vqa_tool", vqa_tool_node)
+    # Add all nodes. traced_node() records per-node timings/counters when RAG_TRACING=1
+    # and returns the node unchanged otherwise.
+    builder.add_node("upload", traced_node("upload", upload))
+    builder.add_node("ask_question", traced_node("ask_question", ask_node))
+    builder.add_node("route_mode", traced_node("route_mode", route_mode_node)) # This is now a regular state-updating node that also provides routing info
+    builder.add_node("rag_tool", traced_node("rag_tool", rag_tool_node))
+    builder.add_node("vqa_tool", traced_node("vqa_tool", vqa_tool_node))
+    builder.add_node("table_tool", traced_node("table_tool", table_tool_node))
+    start_metrics_server() # No-op unless tracing is on and RAG_METRICS_PORT is set
 
     # Define flow
     builder.set_entry_point("upload")
-    builder.add_edge("upload", "ask_question")
+    # A file that failed to load ends the run with upload()'s error as the answer
+    builder.add_conditional_edges("upload", lambda state: END if state.get("upload_error") else "ask_question", {"ask_question": "ask_question", END: END})
     # Instead of conditional_edges, we directly connect to the router node.
     builder.add_edge("ask_question", "route_mode")
 
@@ -48,6 +62,7 @@ def build_graph():
         {
             "rag_tool": "rag_tool",
             "vqa_tool": "vqa_tool",
+            "table_tool": "table_tool",
             END: END # If for some reason __next__ becomes END, handle it.
         }
     )
@@ -55,5 +70,7 @@ def build_graph():
     # End edges (these remain the same)
     builder.add_edge("rag_tool", END)
     builder.add_edge("vqa_tool", END)
+    builder.add_edge("table_tool", END)
 
-    return builder.compile()
\ No newline at end of file
+    # With a checkpointer, invoke() needs config={"configurable": {"thread_id": ...}}
+    return builder.compile(checkpointer=checkpointer)
\ No newline at end of file
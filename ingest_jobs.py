@@ -0,0 +1,189 @@
+# ingest_jobs.py
+# Background ingestion: uploads become jobs on a small worker pool, keyed by content hash.
+# Submitting a file that is already queued or ingesting returns the existing job, so the
+# UI, the upload node and batch runs never embed the same file twice. Jobs report
+# progress after every batch and can be cancelled between batches.
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from bm25_index import BM25Index, bm25_index_path
+from config import CORPUS_COLLECTION_NAME, INGEST_MAX_FINISHED_JOBS, INGEST_WORKERS
+from corpus_index import corpus_contains, corpus_mode, ingest_into_corpus
+from ingestion import IngestCancelled, IngestProgress, ingest_documents, iter_file_documents
+from resources import drop_vectorstore, finish_vectorstore, get_vectorstore, prepare_vectorstore, registry, vectorstore_exists
+from tracing import count, trace_task
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+def collection_for(file_hash: str) -> str:
+    if corpus_mode():
+        return CORPUS_COLLECTION_NAME
+    return f"doc_{file_hash}"
+
+
+def is_indexed(file_hash: str) -> bool:
+    if corpus_mode():
+        return corpus_contains(file_hash)
+    return vectorstore_exists(collection_for(file_hash))
+
+
+class IngestJob:
+    def __init__(self, file_path: str, file_hash: str):
+        self.file_path = file_path
+        self.file_hash = file_hash
+        self.collection_name = collection_for(file_hash)
+        self.status = QUEUED
+        self.progress: Dict[str, float] = IngestProgress().as_dict()
+        self.error: Optional[str] = None
+        self.already_indexed = False
+        self.submitted_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done_event.wait(timeout)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "file_path": self.file_path,
+            "file_hash": self.file_hash,
+            "collection": self.collection_name,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "already_indexed": self.already_indexed,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def run_ingestion(job: IngestJob) -> None:
+    """
+    Indexes one file into its collection (or the shared corpus) plus BM25 index.
+    Never leaves a partial index behind on failure or cancellation.
+    """
+    if is_indexed(job.file_hash):
+        job.already_indexed = True
+        get_vectorstore(job.collection_name) # Warm it for the RAG tool
+        return
+
+    suffix = os.path.splitext(job.file_path)[1].lower()
+    # Pages/rows are produced lazily; spreadsheets come out as header-prefixed, row-aligned chunks
+    docs, already_chunked = iter_file_documents(job.file_path, suffix)
+
+    def on_progress(progress):
+        job.progress = progress
+
+    if corpus_mode():
+        # A failed or cancelled file is removed from the corpus again by ingest_into_corpus()
+        progress = ingest_into_corpus(docs, job.file_path, job.file_hash, split=not already_chunked, progress_callback=on_progress, cancel_event=job.cancel_event)
+        if progress.chunks == 0:
+            raise ValueError("Document loading failed or document is empty.")
+        return
+
+    try:
+        lexical_index = BM25Index() # Built from the same chunks, saved next to the collection
+        vectordb = prepare_vectorstore(job.collection_name)
+        progress = ingest_documents(docs, vectordb, progress_callback=on_progress, split=not already_chunked, lexical_index=lexical_index, cancel_event=job.cancel_event)
+        if progress.chunks == 0:
+            raise ValueError("Document loading failed or document is empty.")
+        finish_vectorstore(job.collection_name, vectordb)
+    except BaseException:
+        drop_vectorstore(job.collection_name) # Never leave a half-built collection behind
+        raise
+    lexical_index.save(bm25_index_path(job.collection_name))
+    registry.put(f"bm25:{job.collection_name}", lexical_index)
+
+
+class IngestJobQueue:
+    """
+    Worker pool for ingestion jobs. One job per content hash at a time; finished jobs are
+    kept (up to INGEST_MAX_FINISHED_JOBS) so their status can still be polled.
+    """
+
+    def __init__(self, max_workers: int = INGEST_WORKERS, runner: Callable[[IngestJob], None] = run_ingestion):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._runner = runner
+        self._jobs: Dict[str, IngestJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, file_path: str, file_hash: str) -> IngestJob:
+        with self._lock:
+            job = self._jobs.get(file_hash)
+            # Queued and running jobs are shared, as are finished ones whose index still exists;
+            # failed/cancelled ones (or a dropped index) are retried
+            if job is not None and (not job.finished or (job.status == DONE and is_indexed(file_hash))):
+                return job
+            job = IngestJob(file_path, file_hash)
+            self._jobs[file_hash] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        logging.info(f"Ingest queue: submitted '{file_path}' ({file_hash}).")
+        return job
+
+    def _run(self, job: IngestJob) -> None:
+        if job.cancel_event.is_set():
+            job.status = CANCELLED
+        else:
+            job.status = RUNNING
+            # Traced on its own (trace id = file hash): it outlives the node that submitted it
+            with trace_task("ingest_job", job.file_hash):
+                try:
+                    self._runner(job)
+                    job.status = DONE
+                except IngestCancelled:
+                    job.status = CANCELLED
+                except Exception as e:
+                    logging.error(f"Ingest queue: '{job.file_path}' failed: {e}")
+                    job.error = str(e)
+                    job.status = FAILED
+                count("pages", job.progress["pages"])
+                count("chunks", job.progress["chunks"])
+                count(job.status)
+        job.finished_at = time.time()
+        job.done_event.set()
+        logging.info(f"Ingest queue: '{job.file_path}' {job.status} ({job.progress}).")
+
+    def get(self, file_hash: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(file_hash)
+
+    def status(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        job = self.get(file_hash)
+        return job.as_dict() if job is not None else None
+
+    def cancel(self, file_hash: str) -> bool:
+        # Takes effect before the job starts or between two embedded batches
+        job = self.get(file_hash)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def jobs(self) -> List[IngestJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.submitted_at, reverse=True)
+
+    def _prune(self) -> None:
+        finished = sorted((job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at)
+        for job in finished[:max(0, len(finished) - INGEST_MAX_FINISHED_JOBS)]:
+            del self._jobs[job.file_hash]
+
+
+def wait_for_job(job: IngestJob, progress_callback: Optional[Callable[[Dict[str, float]], None]] = None, poll_s: float = 0.5) -> IngestJob:
+    # Blocks until the job finishes, relaying its progress from the caller's thread
+    while not job.wait(poll_s):
+        if progress_callback is not None:
+            progress_callback(job.progress)
+    return job
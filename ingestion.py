@@ -0,0 +1,198 @@
+# ingestion.py
+# Generator-based ingestion: load page by page, split incrementally and embed/add
+# fixed-size batches to the vector store as soon as they are ready, so peak memory
+# stays bounded by the batch size instead of the document size.
+import logging
+import time
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import PyPDFLoader, TextLoader, UnstructuredMarkdownLoader, UnstructuredWordDocumentLoader
+
+from tracing import span, timed_iter
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+EMBED_BATCH_SIZE = 64
+TABLE_READ_ROWS = 10_000 # Rows pulled from disk at a time for CSV files
+TABLE_MAX_ROWS_PER_CHUNK = 50
+
+
+class IngestCancelled(Exception):
+    """Raised between batches when an ingestion's cancel event is set."""
+
+
+class IngestProgress:
+    """
+    Running counters for one ingestion, reported to the UI after every batch.
+    """
+
+    def __init__(self):
+        self.pages = 0
+        self.chunks = 0
+        self.started_at = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    @property
+    def pages_per_s(self) -> float:
+        return self.pages / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def chunks_per_s(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "elapsed_s": round(self.elapsed, 3),
+            "pages_per_s": round(self.pages_per_s, 2),
+            "chunks_per_s": round(self.chunks_per_s, 2),
+        }
+
+
+def iter_documents(file_path: str, suffix: str) -> Iterator[Document]:
+    # lazy_load() yields one page (PDF) / one file (TXT, DOCX, MD) at a time instead of the whole list
+    if suffix == ".pdf":
+        yield from PyPDFLoader(file_path).lazy_load()
+    elif suffix == ".txt":
+        yield from TextLoader(file_path, encoding="utf-8").lazy_load()
+    elif suffix == ".docx":
+        yield from UnstructuredWordDocumentLoader(file_path).lazy_load()
+    elif suffix == ".md":
+        yield from UnstructuredMarkdownLoader(file_path).lazy_load()
+
+
+def iter_file_documents(file_path: str, suffix: str) -> Tuple[Iterator[Document], bool]:
+    """
+    Picks the streaming reader for a file type. Returns (documents, already_chunked):
+    spreadsheets come out as row-aligned chunks, everything else still needs splitting.
+    """
+    if suffix in [".csv", ".xlsx"]:
+        return iter_table_chunks(file_path, suffix), True
+    return iter_documents(file_path, suffix), False
+
+
+def _format_row(values: Sequence[Any]) -> str:
+    return " | ".join("" if value is None else str(value) for value in values)
+
+
+def _group_rows(file_path: str, header: str, rows: Iterable[Sequence[Any]], max_chars: int = CHUNK_SIZE, max_rows: int = TABLE_MAX_ROWS_PER_CHUNK) -> Iterator[Document]:
+    # Packs whole rows into chunks that each repeat the column header, so no row is cut in half
+    # and every chunk can be read on its own. Row numbers are 1-based data rows (header excluded).
+    lines: List[str] = []
+    size = len(header)
+    row_start = 1
+    row_number = 0
+    for row_number, values in enumerate(rows, start=1):
+        line = _format_row(values)
+        if lines and (size + len(line) + 1 > max_chars or len(lines) >= max_rows):
+            yield Document(
+                page_content=header + "\n" + "\n".join(lines),
+                metadata={"source": file_path, "row_start": row_start, "row_end": row_number - 1, "columns": header},
+            )
+            lines, size, row_start = [], len(header), row_number
+        lines.append(line)
+        size += len(line) + 1
+
+    if lines:
+        yield Document(
+            page_content=header + "\n" + "\n".join(lines),
+            metadata={"source": file_path, "row_start": row_start, "row_end": row_number, "columns": header},
+        )
+
+
+def iter_table_chunks(file_path: str, suffix: str) -> Iterator[Document]:
+    """
+    Streams a CSV/XLSX file as row-aligned chunks without loading the whole sheet.
+    """
+    if suffix == ".csv":
+        import pandas as pd
+        reader = pd.read_csv(file_path, chunksize=TABLE_READ_ROWS, dtype=str, keep_default_na=False)
+        first = next(reader, None)
+        if first is None:
+            return
+        header = _format_row(first.columns)
+
+        rows = chain.from_iterable(frame.itertuples(index=False, name=None) for frame in chain([first], reader))
+        yield from _group_rows(file_path, header, rows)
+
+    elif suffix == ".xlsx":
+        # openpyxl's read-only mode streams rows from the first sheet, like pd.read_excel() does
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            first_row = next(rows, None)
+            if first_row is None:
+                return
+            yield from _group_rows(file_path, _format_row(first_row), rows)
+        finally:
+            workbook.close()
+
+
+def iter_chunks(documents: Iterable[Document], progress: IngestProgress, splitter: Optional[RecursiveCharacterTextSplitter] = None) -> Iterator[Document]:
+    splitter = splitter or RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    for doc in timed_iter(documents, "load"): # Time spent in the lazy loader reading this page
+        progress.pages += 1
+        with span("split"):
+            chunks = splitter.split_documents([doc])
+        yield from chunks
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def ingest_documents(
+    documents: Iterable[Document],
+    vectordb,
+    batch_size: int = EMBED_BATCH_SIZE,
+    progress_callback: Optional[Callable[[Dict[str, float]], None]] = None,
+    split: bool = True,
+    lexical_index=None,
+    cancel_event=None,
+) -> IngestProgress:
+    """
+    Streams `documents` into `vectordb`. Only one batch of chunks is held in memory at a time.
+    Pass split=False for documents that are already chunked, and a BM25Index as
+    `lexical_index` to index the same chunks for keyword search. Setting `cancel_event`
+    (a threading.Event) stops before the next batch with IngestCancelled.
+    """
+    progress = IngestProgress()
+
+    if split:
+        chunks = iter_chunks(documents, progress)
+    else:
+        chunks = _count_pages(timed_iter(documents, "load"), progress)
+
+    for batch in iter_batches(chunks, batch_size):
+        if cancel_event is not None and cancel_event.is_set():
+            raise IngestCancelled(f"cancelled after {progress.chunks} chunks")
+        with span("embed"):
+            vectordb.add_documents(batch) # Embeds and persists this batch only
+        if lexical_index is not None:
+            with span("bm25_index"):
+                lexical_index.add_documents(batch)
+        progress.chunks += len(batch)
+        if progress_callback is not None:
+            progress_callback(progress.as_dict())
+
+    logging.info(f"Ingestion finished: {progress.as_dict()}")
+    return progress
+
+
+def _count_pages(documents: Iterable[Document], progress: IngestProgress) -> Iterator[Document]:
+    for doc in documents:
+        progress.pages += 1
+        yield doc
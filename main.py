@@ -1,8 +1,13 @@
 import streamlit as st
-import tempfile
 import os
-from graph_builder import build_graph
-from nodes.upload_node import calculate_file_hash
+import uuid
+from checkpointing import session_config
+from nodes.upload_node import IMAGE_EXTENSIONS
+from answer_cache import answer_cache
+from ingest_jobs import QUEUED, RUNNING
+from resources import get_graph, get_ingest_queue, get_upload_store, registry
+from config import TRACING_ENABLED
+from tracing import tracer
 
 st.set_page_config(page_title="🧠 Multi-Modal LangGraph Agent")
 st.title("📄🖼️ LangGraph: RAG + VQA Agent")
@@ -15,33 +20,134 @@ uploaded_file = st.file_uploader("Upload a document or image", type=SUPPORTED_TY
 file_path = None
 # image_path = None
 
+# One LangGraph thread per browser session; the checkpointer keeps its state between reruns
+if "thread_id" not in st.session_state:
+    st.session_state.thread_id = uuid.uuid4().hex
+
 if uploaded_file:
-    suffix = os.path.splitext(uploaded_file.name)[1]
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-        tmp_file.write(uploaded_file.read())
-        file_path = tmp_file.name
-        if suffix.lower() in [".jpg", ".jpeg", ".png"]:
-            image_path = file_path
+    # Streamlit reruns this script on every interaction: only store/hash a new upload once,
+    # so follow-up questions see the same file_path and hit the upload() fast path.
+    # The store hashes while copying and keeps one file per content hash; if the copy was
+    # evicted since, it is simply stored again.
+    upload_store = get_upload_store()
+    if st.session_state.get("uploaded_file_id") != uploaded_file.file_id or not os.path.exists(st.session_state.uploaded_file_path):
+        suffix = os.path.splitext(uploaded_file.name)[1]
+        uploaded_file.seek(0)
+        stored_path, stored_hash = upload_store.store(uploaded_file, suffix)
+        st.session_state.uploaded_file_id = uploaded_file.file_id
+        st.session_state.uploaded_file_path = stored_path
+        st.session_state.uploaded_file_hash = stored_hash
+        # Start indexing in the background right away; the question box stays usable meanwhile
+        if suffix.lower() not in IMAGE_EXTENSIONS:
+            get_ingest_queue().submit(stored_path, stored_hash)
+    else:
+        upload_store.touch(st.session_state.uploaded_file_path) # Still in use: keep it away from eviction
+    file_path = st.session_state.uploaded_file_path
 
     st.success(f"✅ Uploaded: {uploaded_file.name}")
-    file_hash = calculate_file_hash(file_path)
+    file_hash = st.session_state.uploaded_file_hash
     st.info(f"File hash: `{file_hash}`")
 
+    @st.fragment(run_every=1)
+    def ingestion_status():
+        # Polls the background job; only this fragment reruns, not the whole page
+        job = get_ingest_queue().get(file_hash)
+        if job is None or job.status not in (QUEUED, RUNNING):
+            if job is not None and job.error:
+                st.error(f"❌ Ingestion failed: {job.error}")
+            return
+        progress = job.progress
+        status_col, cancel_col = st.columns([4, 1])
+        status_col.caption(
+            f"📥 {job.status.capitalize()}: {progress['pages']} pages / {progress['chunks']} chunks "
+            f"({progress['chunks_per_s']:.1f} chunks/s). Questions on this file wait until it is indexed."
+        )
+        if cancel_col.button("Cancel", key=f"cancel_{file_hash}"):
+            get_ingest_queue().cancel(file_hash)
+
+    ingestion_status()
+
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
 
     # Ask question
+    stream_tokens = st.sidebar.checkbox("⚡ Stream answer tokens", value=True)
+    show_timings = TRACING_ENABLED and st.sidebar.checkbox("⏱️ Show timing panel", value=False)
     user_input = st.text_input("💬 Ask a question about the uploaded file:")
 
     if user_input:
         with st.spinner("🔍 Reasoning..."):
-            graph = build_graph()
-            result = graph.invoke({
-            "input": user_input,
-            "file_path": file_path,
-            "chat_history": st.session_state.chat_history
-        })
+            # Live ingestion progress, updated after every embedded batch
+            progress_placeholder = st.empty()
+
+            def show_progress(progress):
+                progress_placeholder.caption(
+                    f"📥 Ingested {progress['pages']} pages / {progress['chunks']} chunks "
+                    f"({progress['pages_per_s']:.1f} pages/s, {progress['chunks_per_s']:.1f} chunks/s)"
+                )
+
+            graph = get_graph() # Compiled once per process, reused across reruns
+            graph_input = {
+                "input": user_input,
+                "file_path": file_path,
+                "file_hash": file_hash, # Already computed by the upload store; upload() won't rehash
+                "chat_history": st.session_state.chat_history
+            }
+            trace_id = uuid.uuid4().hex # Groups this question's node records in the traces
+            graph_config = session_config(st.session_state.thread_id, progress_callback=show_progress, trace_id=trace_id)
+
+            if stream_tokens:
+                st.write("### ✅ Answer:")
+                result = {}
+
+                def token_stream():
+                    # "custom" carries answer tokens written by the tool nodes, "values" the graph state
+                    for mode, chunk in graph.stream(graph_input, config=graph_config, stream_mode=["custom", "values"]):
+                        if mode == "custom" and "token" in chunk:
+                            yield chunk["token"]
+                        elif mode == "values":
+                            result.update(chunk)
+
+                streamed = st.write_stream(token_stream())
+                if not streamed: # Nodes that don't stream (errors, table queries) only set the final answer
+                    st.markdown(result.get("answer", ""))
+            else:
+                result = graph.invoke(graph_input, config=graph_config)
+                st.write("### ✅ Answer:")
+                st.markdown(result["answer"])
+
+            st.session_state.chat_history = result.get("chat_history", st.session_state.chat_history)
+
+            context_stats = result.get("context_stats")
+            if context_stats:
+                retrieval_ms = ", ".join(
+                    f"{stage[:-3]} {context_stats[stage]:.0f}ms" for stage in ("vector_ms", "lexical_ms", "fusion_ms") if stage in context_stats
+                )
+                st.caption(f"🧮 Prompt: {context_stats['prompt_tokens']} tokens (saved {context_stats['saved_tokens']}) · Retrieval: {retrieval_ms}")
+
+            if show_timings:
+                # Per-node wall time, sub-spans and counters for this question (+ this file's ingestion job)
+                with st.expander("⏱️ Timings", expanded=True):
+                    for record in tracer.recent(file_hash) + tracer.recent(trace_id):
+                        spans = ", ".join(f"{name} {ms:.0f}ms" for name, ms in record["spans_ms"].items())
+                        counters = ", ".join(f"{name}={value:g}" for name, value in record["counters"].items())
+                        st.write(f"**{record['node']}** — {record['wall_ms']:.0f}ms" + (f" · {spans}" if spans else "") + (f" · {counters}" if counters else ""))
+
+# Warm resource registry: what has been loaded in this process and how often it was reused
+with st.sidebar.expander("⚙️ Warm resources"):
+    resource_stats = registry.stats()
+    if not resource_stats:
+        st.caption("Nothing loaded yet.")
+    for name, entry in resource_stats.items():
+        st.write(f"**{name}** — loaded in {entry['load_time_s']:.2f}s, reused {entry['hits']}×")
 
+with st.sidebar.expander("📥 Ingestion jobs"):
+    jobs = get_ingest_queue().jobs()
+    if not jobs:
+        st.caption("No ingestion jobs yet.")
+    for job in jobs[:10]:
+        st.write(f"**{os.path.basename(job.file_path)}** — {job.status}, {job.progress['chunks']} chunks")
 
-            st.write("### ✅ Answer:")
-            st.markdown(result["answer"])
+with st.sidebar.expander("💬 Answer cache"):
+    cache_stats = answer_cache.stats()
+    st.write(f"{cache_stats['hits']} hits / {cache_stats['misses']} misses, {cache_stats['entries']} cached answers")
@@ -1,12 +1,15 @@
 import os
-import hashlib
-from typing import Dict
+from typing import Dict, Optional
 from langchain_community.document_loaders import PyPDFLoader, TextLoader, UnstructuredWordDocumentLoader, UnstructuredMarkdownLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+from langchain_core.runnables import RunnableConfig
 import logging
-import chromadb # Import the chromadb client to manage collections
+
+from config import CORPUS_COLLECTION_NAME
+from corpus_index import corpus_mode
+from ingest_jobs import CANCELLED, DONE, IngestJob, is_indexed, wait_for_job
+from resources import get_ingest_queue, get_vectorstore
+from tracing import count, span
+from upload_store import hash_file
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
@@ -20,178 +23,138 @@ LOADER_MAP = {
 }
 
 IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png"]
-CHROMA_DB_PERSIST_DIR = "./chroma_db_files" # Base directory for all file-specific collections
 
-# Helper to calculate file hash
+# Helper to calculate file hash (algorithm and read size are set in config.py)
 def calculate_file_hash(file_path):
-    hasher = hashlib.md5()
-    with open(file_path, 'rb') as f:
-        # Read in chunks for large files
-        for chunk in iter(lambda: f.read(4096), b""):  #This reads a file in binary mode ('rb') and in chunks (4096 bytes at a time).
-            hasher.update(chunk) #The chunks are fed into an MD5 hasher to create a fingerprint of the file contents.
-    return hasher.hexdigest() # hex string that uniquely identifies the file content
+    return hash_file(file_path)
 
 # Helper to generate a valid, unique collection name
 def generate_collection_name(file_path: str, file_hash: str) -> str:
     return f"doc_{file_hash}"
 
 
-def upload(state: Dict) -> Dict:
+def file_signature(file_path: str) -> str:
+    # Cheap fingerprint (size + mtime) used to detect an unchanged file without re-reading it
+    stat = os.stat(file_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _error_state(state: Dict, answer: str) -> Dict:
+    # Forgets the previous file (the checkpointer would otherwise keep its collection), and
+    # upload_error sends the graph straight to END so no tool answers from stale state
+    return {
+        **state,
+        "is_image": False,
+        "is_table": False,
+        "documents": [],
+        "answer": answer,
+        "upload_error": answer,
+        "active_collection_name": None,
+        "last_processed_file_path": None,
+        "last_processed_file_hash": None,
+        "last_processed_file_signature": None,
+    }
+
+
+def _failed_ingestion_state(state: Dict, job: IngestJob) -> Dict:
+    error = "ingestion was cancelled" if job.status == CANCELLED else job.error
+    logging.error(f"Document load error: {error}")
+    return _error_state(state, f"Error loading document: {error}")
+
+
+def upload(state: Dict, config: Optional[RunnableConfig] = None) -> Dict:
     file_path = state.get("file_path", "")
     suffix = os.path.splitext(file_path)[1].lower()
+    # Hash computed by the caller while storing the upload. It only describes this question's
+    # file_path, so it is cleared here instead of being carried over by the checkpointer.
+    precomputed_hash = state.get("file_hash")
+    state = {**state, "file_hash": None, "upload_error": None}
 
     if not file_path:
         logging.error("No file_path provided in state.")
-        return {**state, "is_image": False, "documents": [], "vectordb": None, "answer": "Error: No file selected for upload.", "last_processed_file_path": None, "last_processed_file_hash": None}
-
-    current_file_content_hash = calculate_file_hash(file_path)
-    current_collection_name = generate_collection_name(file_path, current_file_content_hash)
-
-    # --- Optimization Check: Is this file already processed and loaded into state? ---
-    # This check is for subsequent queries on the SAME file within the SAME session
-    if state.get("last_processed_file_hash") == current_file_content_hash and state.get("vectordb") is not None:
-        logging.info(f"Content hash matches for '{current_collection_name}', and VectorDB is already in state. Skipping re-processing.")
-        return {**state} # Return current state if no re-processing needed
-
-    # --- Initialize ChromaDB client ---
-    # We use PersistentClient to access collections from the persist_directory
-    client = chromadb.PersistentClient(path=CHROMA_DB_PERSIST_DIR)
-    
-    # Check if the specific collection for this file already exists on disk
+        return _error_state(state, "Error: No file selected for upload.")
+
+    # --- Optimization Check: Is this file already processed in this session? ---
+    # The checkpointer keeps the session state between questions, so a follow-up on the SAME,
+    # unchanged file skips hashing and collection lookup entirely.
+    current_file_signature = file_signature(file_path)
+    if (
+        state.get("last_processed_file_path") == file_path
+        and state.get("last_processed_file_signature") == current_file_signature
+        and (state.get("active_collection_name") or state.get("is_image"))
+    ):
+        logging.info(f"'{file_path}' unchanged since last question. Skipping hashing and re-processing.")
+        count("fast_path")
+        return {**state}
+
+    if precomputed_hash:
+        current_file_content_hash = precomputed_hash
+        count("hash_reused")
+    else:
+        with span("hash"):
+            current_file_content_hash = calculate_file_hash(file_path)
+    # In corpus mode every file shares one collection and is scoped by file_hash metadata
+    if corpus_mode():
+        current_collection_name = CORPUS_COLLECTION_NAME
+    else:
+        current_collection_name = generate_collection_name(file_path, current_file_content_hash)
+
+    # A background job for this content (e.g. submitted by the UI at upload time) may still be
+    # running: attach to it instead of looking at a half-built collection or ingesting twice
+    progress_callback = (config or {}).get("configurable", {}).get("progress_callback")
+    ingest_queue = get_ingest_queue()
+    job = ingest_queue.get(current_file_content_hash)
+    if job is not None and not job.finished:
+        logging.info(f"Attaching to in-flight ingestion of '{file_path}'.")
+        with span("ingest_wait"):
+            wait_for_job(job, progress_callback)
+        if job.status != DONE:
+            return _failed_ingestion_state(state, job)
+
+    # Check if this file is already indexed on disk (its own collection, or its chunks in the corpus)
     # This is crucial for handling re-uploads of DIFFERENT documents
-    collection_exists_on_disk = False
-    try:
-        # get_collection will raise an exception if it doesn't exist
-        # We don't need the collection object here, just to know if it exists
-        client.get_collection(name=current_collection_name)
-        collection_exists_on_disk = True
-        logging.info(f"Collection '{current_collection_name}' already exists on disk.")
-    except Exception as e:
-        logging.info(f"Collection '{current_collection_name}' does not exist on disk or error accessing: {e}")
-        collection_exists_on_disk = False # Ensure it's false on any error
-
-    vectordb = None
+    with span("index_lookup"):
+        collection_exists_on_disk = is_indexed(current_file_content_hash)
+    logging.info(f"'{file_path}' already indexed in '{current_collection_name}': {collection_exists_on_disk}")
 
     if collection_exists_on_disk:
-        # If collection exists, just load it for use
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        vectordb = Chroma(
-            client=client, # Pass the client to ensure it uses the persistent client
-            collection_name=current_collection_name,
-            embedding_function=embeddings,
-            persist_directory=CHROMA_DB_PERSIST_DIR # Important: persist_directory must match the client's path
-        )
-        logging.info(f"Loaded existing ChromaDB collection '{current_collection_name}'.")
+        # If collection exists, just warm it up for use by the RAG tool
+        get_vectorstore(current_collection_name)
+        logging.info(f"Loaded existing collection '{current_collection_name}'.")
     else:
         # If it doesn't exist, we need to process the file and create the collection
         
         # If it's an image
         if suffix in IMAGE_EXTENSIONS:
             logging.info(f"Detected image file: {file_path}. No vector DB created for images.")
-            return {**state, "is_image": True, "documents": [], "vectordb": None, "last_processed_file_path": file_path, "last_processed_file_hash": current_file_content_hash}
+            return {**state, "is_image": True, "documents": [], "last_processed_file_path": file_path, "last_processed_file_hash": current_file_content_hash, "last_processed_file_signature": current_file_signature, "active_collection_name": None, "is_table": False}
 
         # Else it's a document
         loader_type = LOADER_MAP.get(suffix)
 
         if not loader_type:
             logging.error(f"Unsupported file type: {suffix}")
-            return {
-                **state,
-                "answer": f"Error: Unsupported file type: {suffix}"
-            }
-
-        docs = []
-        if loader_type == "custom" and suffix in [".csv", ".xlsx"]:
-            logging.info(f"Processing tabular file: {file_path}")
-            try:
-                import pandas as pd
-                if suffix == ".csv":
-                    df = pd.read_csv(file_path)
-                elif suffix == ".xlsx" or suffix == ".xls":
-                    df = pd.read_excel(file_path)
-
-                row_strings = df.astype(str).apply(lambda row: " | ".join(row), axis=1).tolist()
-                content = "\n".join(row_strings)
-
-                from langchain.schema import Document
-                docs = [Document(page_content=content)]
-            except Exception as e:
-                logging.error(f"Tabular file load error: {e}")
-                return {
-                    **state,
-                    "is_image": False,
-                    "documents": [],
-                    "vectordb": None,
-                    "answer": f"Error loading {suffix.upper()} file: {e}",
-                    "last_processed_file_path": file_path,
-                    "last_processed_file_hash": None,
-                }
-        elif loader_type == PyPDFLoader and suffix in ['.pdf']:
-            logging.info(f"Loading document file: {file_path} using {loader_type.__name__}")
-            try:
-                loader = loader_type(file_path)
-                docs = loader.load()
-            except Exception as e:
-                logging.error(f"Document load error: {e}")
-                return {
-                    **state,
-                    "is_image": False,
-                    "documents": [],
-                    "vectordb": None,
-                    "answer": f"Error loading document: {e}",
-                    "last_processed_file_path": file_path,
-                    "last_processed_file_hash": None,
-                }
-
-        elif loader_type == TextLoader and suffix in ['.txt']:
-            logging.info(f"Loading document file: {file_path} using {loader_type.__name__}")
-            try:
-                loader = TextLoader(file_path, encoding="utf-8")
-                docs = loader.load()
-                
-
-            except Exception as e:
-                logging.error(f"Document load error: {e}")
-                return {
-                    **state,
-                    "is_image": False,
-                    "documents": [],
-                    "vectordb": None,
-                    "answer": f"Error loading document: {e}",
-                    "last_processed_file_path": file_path,
-                    "last_processed_file_hash": None,
-                }
-
-           
-
-
-        if not docs:
-            logging.error("Document loading failed or document is empty.")
-            return {**state, "is_image": False, "documents": [], "vectordb": None, "answer": "Error: Document loading failed or document is empty.", "last_processed_file_path": file_path, "last_processed_file_hash": current_file_content_hash}
-
-        logging.info("Splitting and embedding documents...")
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        chunks = splitter.split_documents(docs)
-
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-        # Create the collection and add documents
-        # Note: Chroma.from_documents internally calls client.get_or_create_collection
-        # so this is the correct way to create and populate it if it doesn't exist.
-        vectordb = Chroma.from_documents(
-            documents=chunks,
-            collection_name=current_collection_name,
-            embedding=embeddings,
-            persist_directory=CHROMA_DB_PERSIST_DIR # This needs to match the client path
-        )
+            return _error_state(state, f"Error: Unsupported file type: {suffix}")
+
+        # Ingestion runs on the background worker pool (see ingest_jobs.py); this question waits for it,
+        # while questions on other, already indexed files keep being answered.
+        loader_name = "tabular rows" if loader_type == "custom" else loader_type.__name__
+        logging.info(f"Submitting ingestion of {file_path} ({loader_name})")
+        with span("ingest_wait"): # Load/split/embed spans are in the job's own "ingest_job" trace
+            job = wait_for_job(ingest_queue.submit(file_path, current_file_content_hash), progress_callback)
+        if job.status != DONE:
+            return _failed_ingestion_state(state, job)
+        count("chunks_ingested", job.progress["chunks"])
         logging.info(f"New collection '{current_collection_name}' created and documents processed.")
 
+    # Only the collection name goes into state: it has to survive checkpointing between questions
     return {
         **state,
         "is_image": False,
-        "documents": chunks if 'chunks' in locals() else [], # Only pass chunks if they were just generated
-        "vectordb": vectordb,
+        "is_table": suffix in [".csv", ".xlsx"], # Routed to the structured table tool
+        "documents": [],
         "last_processed_file_path": file_path,
         "last_processed_file_hash": current_file_content_hash,
+        "last_processed_file_signature": current_file_signature,
         "active_collection_name": current_collection_name # Store the name of the active collection
     }
\ No newline at end of file
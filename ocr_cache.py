@@ -0,0 +1,137 @@
+# ocr_cache.py
+# Content-addressed, size-bounded on-disk cache of PaddleOCR results.
+# Entries are keyed by the image's content hash plus the OCR config, so repeated
+# questions about the same image skip OCR entirely.
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+from config import OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES, OCR_CONFIG
+from nodes.upload_node import IMAGE_EXTENSIONS, calculate_file_hash
+from ocr_pipeline import PREPROCESS_CONFIG, ocr_batch, ocr_image
+from resources import OCR_LOCK, get_ocr_engine
+from tracing import count, record_span
+
+
+class OCRCache:
+    """
+    One JSON file per entry. Least-recently-used entries (by file mtime, refreshed on
+    every hit) are evicted once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str = OCR_CACHE_DIR, max_bytes: int = OCR_CACHE_MAX_BYTES, ocr_config: Optional[Dict] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ocr_config = ocr_config or OCR_CONFIG
+        self._config_tag = hashlib.md5(json.dumps(self.ocr_config, sort_keys=True).encode()).hexdigest()[:12]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{content_hash}_{self._config_tag}.json")
+
+    def get(self, content_hash: str) -> Optional[Dict[str, list]]:
+        path = self._entry_path(content_hash)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                os.utime(path) # Mark as recently used
+                self.hits += 1
+                return entry
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+
+    def put(self, content_hash: str, entry: Dict[str, list]) -> None:
+        path = self._entry_path(content_hash)
+        with self._lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path) # Atomic, so readers never see half-written entries
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+            logging.info(f"OCR cache: evicted '{name}'")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+ocr_cache = OCRCache(ocr_config={**OCR_CONFIG, "preprocess": PREPROCESS_CONFIG})
+
+
+def run_ocr(file_path: str, content_hash: Optional[str] = None) -> Dict[str, List]:
+    """
+    Returns {"rec_texts", "rec_boxes", "rec_scores"} for an image, from the cache when possible.
+    """
+    content_hash = content_hash or calculate_file_hash(file_path)
+
+    cached = ocr_cache.get(content_hash)
+    if cached is not None:
+        logging.info(f"OCR cache hit for '{file_path}' ({content_hash}).")
+        count("ocr_cache_hit")
+        return cached
+    count("ocr_cache_miss")
+
+    # Downsampled/tiled, all tiles in one batch; boxes come back in original-image coordinates
+    entry, timings = ocr_image(file_path, get_ocr_engine(), lock=OCR_LOCK)
+    logging.info(f"OCR of '{file_path}': {len(entry['rec_texts'])} lines, {timings}")
+    for stage in ("preprocess_ms", "ocr_ms", "postprocess_ms"):
+        record_span(f"ocr_{stage[:-3]}", timings[stage])
+    ocr_cache.put(content_hash, entry)
+    return entry
+
+
+def prewarm(directory: str, workers: Optional[int] = None) -> int:
+    """
+    OCRs every image under `directory` that is not cached yet, in a process pool.
+    Returns the number of images seen.
+    """
+    pending = {}
+    count = 0
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            count += 1
+            content_hash = calculate_file_hash(path)
+            if ocr_cache.get(content_hash) is None:
+                pending[path] = content_hash
+
+    batch_kwargs = {"workers": workers} if workers else {}
+    for path, (entry, _, error) in ocr_batch(list(pending), **batch_kwargs).items():
+        if error is None:
+            ocr_cache.put(pending[path], entry)
+    logging.info(f"OCR cache pre-warmed over {count} images ({len(pending)} OCRed) in '{directory}'. Stats: {ocr_cache.stats()}")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-warm the OCR cache over a directory of images.")
+    parser.add_argument("directory", nargs="?", default="Data/Images")
+    parser.add_argument("--workers", type=int, default=None, help="OCR processes (default: OCR_WORKERS)")
+    args = parser.parse_args()
+    prewarm(args.directory, args.workers)
@@ -0,0 +1,152 @@
+# ocr_pipeline.py
+# OCR pre-processing and batching. Oversized images are downsampled, elongated ones are
+# tiled with overlap, all tiles of an image go through the engine as one batch, and the
+# recognized lines are mapped back to original-image coordinates with their confidences.
+# Batches of images run in a process pool with one engine per worker process.
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from config import OCR_CONFIG, OCR_MAX_SIDE, OCR_MIN_SCORE, OCR_TILE_ASPECT, OCR_TILE_OVERLAP, OCR_WORKERS
+
+# Part of the OCR cache key: changing how images are prepared must not serve stale text
+PREPROCESS_CONFIG = {"max_side": OCR_MAX_SIDE, "tile_aspect": OCR_TILE_ASPECT, "tile_overlap": OCR_TILE_OVERLAP, "min_score": OCR_MIN_SCORE}
+
+Tile = Tuple[np.ndarray, int, int] # (BGR pixels, x offset, y offset) in the resized image
+
+
+def _to_list(value: Any) -> list:
+    # PaddleOCR returns numpy arrays for boxes/scores; JSON needs plain lists
+    if value is None:
+        return []
+    return value.tolist() if hasattr(value, "tolist") else list(value)
+
+
+def _spans(length: int, tile: int, overlap: int) -> List[Tuple[int, int]]:
+    if length <= tile:
+        return [(0, length)]
+    step = tile - overlap
+    starts = list(range(0, length - tile, step)) + [length - tile]
+    return [(start, start + tile) for start in starts]
+
+
+def prepare_image(file_path: str) -> Tuple[List[Tile], float]:
+    """
+    Loads an image and returns (tiles, scale), where scale maps resized pixels back to
+    the original (original = resized / scale).
+    """
+    image = Image.open(file_path).convert("RGB") # Drops alpha / palette modes
+    width, height = image.size
+    long_side, short_side = max(width, height), min(width, height)
+
+    # Only images that are both too long and elongated are tiled; a wide screenshot just goes through whole
+    elongated = long_side > OCR_MAX_SIDE and long_side > OCR_TILE_ASPECT * short_side
+    # Normal images: cap the long side. Elongated ones: cap the short side, then tile the long one.
+    scale = min(1.0, OCR_MAX_SIDE / (short_side if elongated else long_side))
+    if scale < 1.0:
+        image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+    pixels = np.asarray(image)[:, :, ::-1] # PaddleOCR expects BGR, like cv2.imread
+    height, width = pixels.shape[:2]
+
+    if not elongated:
+        return [(np.ascontiguousarray(pixels), 0, 0)], scale
+
+    tile_length = min(width, height) # Square-ish tiles, what the detector handles best
+    tiles = []
+    if height >= width:
+        for top, bottom in _spans(height, tile_length, OCR_TILE_OVERLAP):
+            tiles.append((np.ascontiguousarray(pixels[top:bottom]), 0, top))
+    else:
+        for left, right in _spans(width, tile_length, OCR_TILE_OVERLAP):
+            tiles.append((np.ascontiguousarray(pixels[:, left:right]), left, 0))
+    return tiles, scale
+
+
+def merge_tile_results(pages: Sequence[Dict[str, Any]], tiles: List[Tile], scale: float, min_score: float = OCR_MIN_SCORE) -> Dict[str, List]:
+    """
+    Maps each tile's lines back to original-image coordinates. Neighbouring tiles overlap, so
+    each owns the lines whose centre lies before the middle of its overlap with the next one.
+    """
+    vertical = len(tiles) > 1 and tiles[1][1] == 0 # Tiles stacked top to bottom (not left to right)
+    starts = [y if vertical else x for _, x, y in tiles]
+    ends = [start + (tile.shape[0] if vertical else tile.shape[1]) for start, (tile, _, _) in zip(starts, tiles)]
+    cuts = [float("-inf")] + [(ends[i] + starts[i + 1]) / 2 for i in range(len(tiles) - 1)] + [float("inf")]
+
+    texts, boxes, scores = [], [], []
+    for index, (page, (_, x_offset, y_offset)) in enumerate(zip(pages, tiles)):
+        for text, box, score in zip(page["rec_texts"], _to_list(page.get("rec_boxes")), _to_list(page.get("rec_scores"))):
+            if score < min_score or not str(text).strip():
+                continue
+            x1, y1, x2, y2 = box[:4]
+            x1, x2, y1, y2 = x1 + x_offset, x2 + x_offset, y1 + y_offset, y2 + y_offset
+            centre = (y1 + y2) / 2 if vertical else (x1 + x2) / 2
+            if not cuts[index] <= centre < cuts[index + 1]:
+                continue # Owned by the neighbouring tile
+            texts.append(text)
+            boxes.append([round(x1 / scale), round(y1 / scale), round(x2 / scale), round(y2 / scale)])
+            scores.append(float(score))
+    return {"rec_texts": texts, "rec_boxes": boxes, "rec_scores": scores}
+
+
+def ocr_image(file_path: str, engine, lock=None) -> Tuple[Dict[str, List], Dict[str, float]]:
+    """
+    Runs one image through `engine`. Returns ({"rec_texts", "rec_boxes", "rec_scores"},
+    per-stage timings in ms). Pass `lock` when the engine is shared between threads.
+    """
+    timings = {}
+    start = time.perf_counter()
+    tiles, scale = prepare_image(file_path)
+    timings["preprocess_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    batch = [tile for tile, _, _ in tiles] # All tiles of an image in one predict() call
+    if lock is not None:
+        with lock:
+            pages = engine.predict(batch)
+    else:
+        pages = engine.predict(batch)
+    timings["ocr_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    entry = merge_tile_results(pages, tiles, scale)
+    timings["postprocess_ms"] = (time.perf_counter() - start) * 1000
+    timings["tiles"] = len(tiles)
+    return entry, timings
+
+
+# --- Process pool: one engine per worker process ---
+
+_worker_engine = None
+
+
+def _init_worker(ocr_config: Dict[str, Any]) -> None:
+    global _worker_engine
+    from paddleocr import PaddleOCR
+    _worker_engine = PaddleOCR(**ocr_config)
+
+
+def _ocr_in_worker(file_path: str) -> Tuple[str, Optional[Dict[str, List]], Dict[str, float], Optional[str]]:
+    try:
+        entry, timings = ocr_image(file_path, _worker_engine)
+        return file_path, entry, timings, None
+    except Exception as e:
+        return file_path, None, {}, str(e)
+
+
+def ocr_batch(file_paths: Sequence[str], workers: int = OCR_WORKERS) -> Dict[str, Tuple[Optional[Dict[str, List]], Dict[str, float], Optional[str]]]:
+    """
+    OCRs many images in a process pool. Returns {path: (entry or None, timings, error or None)}.
+    """
+    results = {}
+    if not file_paths:
+        return results
+    with ProcessPoolExecutor(max_workers=min(workers, len(file_paths)), initializer=_init_worker, initargs=(OCR_CONFIG,)) as pool:
+        for file_path, entry, timings, error in pool.map(_ocr_in_worker, file_paths):
+            if error is not None:
+                logging.error(f"OCR failed for '{file_path}': {error}")
+            results[file_path] = (entry, timings, error)
+    return results
@@ -1,27 +1,24 @@
 #rag_tool.py
-import re
+import logging
 from typing import Dict
 from langchain.schema import SystemMessage
-from langchain.schema.messages import HumanMessage
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+from langchain.schema.messages import AIMessage, HumanMessage
 
-import os
-from dotenv import load_dotenv
-load_dotenv()
-
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-llm = ChatGroq(model="deepseek-r1-distill-llama-70b", api_key=GROQ_API_KEY)
+from answer_cache import answer_cache, is_context_dependent
+from config import ANSWER_CACHE_ENABLED, CORPUS_COLLECTION_NAME
+from context_assembler import assemble_context
+from corpus_index import query_scope, scope_filter
+from resources import get_bm25_index, get_embeddings, get_llm, get_vectorstore
+from retrieval import hybrid_search
+from streaming import get_token_writer, stream_answer
+from tracing import count, span
 
 
 def rag_tool_node(state: Dict) -> Dict:
-    import logging
-    logging.basicConfig(level=logging.INFO)
-
     query = state["input"]
-    vectordb = state.get("vectordb")
-    chat_history = state.get("chat_history", [])
+    collection_name = state.get("active_collection_name")
+    vectordb = get_vectorstore(collection_name) if collection_name else None
+    chat_history = list(state.get("chat_history") or []) # Copy: checkpointed values must not be mutated in place
 
     if vectordb is None:
         print("⚠️ RAG Tool: Document database not found in state.")
@@ -30,8 +27,39 @@ def rag_tool_node(state: Dict) -> Dict:
             "answer": "⚠️ Document database not available for RAG. Please ensure a document was uploaded successfully."
         }
 
-    retriever = vectordb.as_retriever(search_kwargs={"k": 4})
-    top_docs = retriever.invoke(query)
+    # The shared corpus collection is scoped to the requested files with a metadata filter;
+    # the answer cache is keyed by collection *and* scope so answers never leak across files.
+    where = None
+    cache_key = collection_name
+    if collection_name == CORPUS_COLLECTION_NAME:
+        scope = query_scope(state)
+        where = scope_filter(scope)
+        cache_key = f"{collection_name}:{','.join(sorted(scope))}"
+
+    # The question is embedded once: for the answer cache lookup and for retrieval
+    with span("embed_query"):
+        query_embedding = get_embeddings().embed_query(query)
+
+    # --- Semantic answer cache: a near-identical earlier question on this collection ---
+    use_answer_cache = ANSWER_CACHE_ENABLED and not is_context_dependent(query, chat_history)
+    if use_answer_cache:
+        with span("answer_cache"):
+            cached_answer = answer_cache.lookup(cache_key, query_embedding)
+        count("answer_cache_hit" if cached_answer is not None else "answer_cache_miss")
+        if cached_answer is not None:
+            get_token_writer()({"token": cached_answer})
+            chat_history.append(HumanMessage(content=query))
+            chat_history.append(AIMessage(content=cached_answer))
+            return {
+                **state,
+                "answer": cached_answer,
+                "chat_history": chat_history
+            }
+
+    # Vector + BM25 results fused with reciprocal rank fusion
+    with span("retrieval"):
+        top_docs, retrieval_timings = hybrid_search(vectordb, query, query_embedding, get_bm25_index(collection_name), where=where)
+    count("chunks_retrieved", len(top_docs))
 
     if not top_docs:
         print("⚠️ RAG Tool: No relevant information found.")
@@ -41,7 +69,16 @@ def rag_tool_node(state: Dict) -> Dict:
             "chat_history": chat_history  # Keep history intact
         }
 
-    context = "\n\n".join([doc.page_content for doc in top_docs])
+    # Fit merged chunks + recent history into the token budget; older turns roll into a summary
+    with span("assemble_context"):
+        assembled = assemble_context(
+            query,
+            [doc.page_content for doc in top_docs],
+            chat_history,
+            state.get("history_summary") or "",
+        )
+    count("prompt_tokens", assembled["stats"]["prompt_tokens"])
+    context = assembled["context"]
 
     # Build message history for LLM input
     messages = [
@@ -53,36 +90,34 @@ def rag_tool_node(state: Dict) -> Dict:
         )),
     ]
 
-    messages.extend(chat_history)  # Add past turns
+    if assembled["history_summary"]:
+        messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{assembled['history_summary']}"))
+
+    messages.extend(assembled["history"])  # Add recent past turns (reasoning stripped)
 
     # Add current question
     messages.append(HumanMessage(content=f"Documents:\n{context}\n\nQuestion: {query}"))
 
-    # Run LLM
-    response = llm.invoke(messages)
-    raw_response = response.content
-    cleaned = re.sub(r"<think>.*?</think>", "", raw_response, flags=re.DOTALL).strip()
+    # Run LLM, streaming tokens (minus <think> reasoning) to the UI as they arrive
+    cleaned, raw_response = stream_answer(get_llm(), messages)
 
     # Log the final cleaned output
     logging.info(f"LLM Response from RAG: {cleaned}")
 
-    # Update memory with current turn
+    if use_answer_cache:
+        answer_cache.put(cache_key, query, query_embedding, cleaned)
+
+    # Update memory with current turn. Only the answer is stored: replaying the <think>
+    # reasoning on later turns costs tokens without adding information.
+    chat_history = assembled["history"]
     chat_history.append(HumanMessage(content=query))
-    chat_history.append(response)
+    chat_history.append(AIMessage(content=cleaned))
 
     return {
         **state,
         "answer": cleaned,
-        "chat_history": chat_history
+        "chat_history": chat_history,
+        "history_summary": assembled["history_summary"],
+        "context_stats": {**assembled["stats"], **retrieval_timings}
     }
 
-
-    import logging
-    # basicConfig only sets up logging if no handlers are configured.
-    # If you've configured it elsewhere (e.g., in main.py), this might not re-configure it.
-    logging.basicConfig(level=logging.INFO)
-    logging.info(f"LLM Response from RAG: {response}") # Added prefix for clarity in logs
-
-    cleaned = re.sub(r"<think>.*?</think>", "", response, flags=re.DOTALL).strip()
-
-    return {**state, "answer": cleaned}
\ No newline at end of file
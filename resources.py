@@ -0,0 +1,317 @@
+# resources.py
+# Process-wide registry of expensive objects (embeddings, LLM, OCR engine, Chroma client,
+# upload store, compiled graph). Each one is built lazily on first use and then shared by every
+# request in the process.
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from config import CHROMA_DB_PERSIST_DIR, CORPUS_COLLECTION_NAME, EMBEDDING_MODEL_NAME, LLM_MODEL_NAME, OCR_CONFIG, REGISTRY_MAX_BM25_INDEXES, REGISTRY_MAX_TABLES, REGISTRY_MAX_VECTORSTORES, VECTOR_BACKEND
+
+
+class ResourceRegistry:
+    """
+    Thread-safe, lazily populated cache of named resources.
+    Keeps load time and hit counts per resource so the UI can show them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._resources: Dict[str, Any] = {}
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        # Per-file resources (vector stores, BM25 indexes, tables) are kept LRU-bounded per name prefix
+        self._limits: Dict[str, int] = {}
+        self._recent: Dict[str, "OrderedDict[str, None]"] = {}
+        self._pinned: set = set()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        with self._lock:
+            self._factories[name] = factory
+
+    def limit(self, prefix: str, max_entries: int) -> None:
+        # At most `max_entries` resources named "<prefix>..." are kept; the least recently used go first
+        with self._lock:
+            self._limits[prefix] = max_entries
+            self._recent.setdefault(prefix, OrderedDict())
+
+    def pin(self, name: str) -> None:
+        # Exempts a resource from its prefix limit (e.g. the shared corpus, mutated in place by ingests)
+        with self._lock:
+            self._pinned.add(name)
+
+    def _limited_prefix(self, name: str) -> Optional[str]:
+        if name in self._pinned:
+            return None
+        return next((prefix for prefix in self._limits if name.startswith(prefix)), None)
+
+    def _touch(self, name: str) -> None:
+        # Marks `name` as most recently used and evicts past the limit. Call with _lock held.
+        prefix = self._limited_prefix(name)
+        if prefix is None:
+            return
+        recent = self._recent[prefix]
+        recent[name] = None
+        recent.move_to_end(name)
+        while len(recent) > self._limits[prefix]:
+            oldest, _ = recent.popitem(last=False)
+            self._resources.pop(oldest, None)
+            self._stats.pop(oldest, None)
+            logging.info(f"Registry: evicted '{oldest}' (least recently used of '{prefix}*').")
+
+    def get(self, name: str, factory: Optional[Callable[[], Any]] = None) -> Any:
+        # Fast path: resource already built
+        with self._lock:
+            if name in self._resources:
+                self._stats[name]["hits"] += 1
+                self._touch(name)
+                return self._resources[name]
+            build_lock = self._build_locks.setdefault(name, threading.Lock())
+            factory = factory or self._factories.get(name)
+
+        if factory is None:
+            raise KeyError(f"No factory registered for resource '{name}'")
+
+        # Only one thread builds a given resource; the others wait and then reuse it
+        with build_lock:
+            with self._lock:
+                if name in self._resources:
+                    self._stats[name]["hits"] += 1
+                    self._touch(name)
+                    return self._resources[name]
+
+            logging.info(f"Registry: building resource '{name}'...")
+            start = time.perf_counter()
+            resource = factory()
+            load_time = time.perf_counter() - start
+            logging.info(f"Registry: resource '{name}' ready in {load_time:.2f}s")
+
+            with self._lock:
+                self._resources[name] = resource
+                self._stats[name] = {"load_time_s": load_time, "hits": 0, "loaded_at": time.time()}
+                self._touch(name)
+            return resource
+
+    def put(self, name: str, resource: Any) -> None:
+        # Installs an already-built resource (e.g. an index created during ingestion)
+        with self._lock:
+            self._resources[name] = resource
+            self._stats[name] = {"load_time_s": 0.0, "hits": 0, "loaded_at": time.time()}
+            self._touch(name)
+
+    def evict(self, name: str) -> None:
+        with self._lock:
+            self._resources.pop(name, None)
+            self._stats.pop(name, None)
+            prefix = self._limited_prefix(name)
+            if prefix is not None:
+                self._recent[prefix].pop(name, None)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._stats.items()}
+
+
+registry = ResourceRegistry()
+
+# PaddleOCR predictors are not safe to share between threads, so callers hold this while predicting
+OCR_LOCK = threading.Lock()
+
+
+def _build_embeddings():
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from embedding_cache import CachedEmbeddings
+    # Chunks already embedded by an earlier upload (same text, same model) are served from disk
+    return CachedEmbeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME), EMBEDDING_MODEL_NAME)
+
+
+def _build_llm():
+    from dotenv import load_dotenv
+    from langchain_groq import ChatGroq
+    load_dotenv()
+    return ChatGroq(model=LLM_MODEL_NAME, api_key=os.getenv("GROQ_API_KEY"))
+
+
+def _build_ocr_engine():
+    from paddleocr import PaddleOCR
+    # use_angle_cls handles rotated text lines; lang selects the recognition model
+    return PaddleOCR(**OCR_CONFIG)
+
+
+def _build_chroma_client():
+    import chromadb
+    return chromadb.PersistentClient(path=CHROMA_DB_PERSIST_DIR)
+
+
+def _build_checkpointer():
+    from checkpointing import create_checkpointer
+    return create_checkpointer()
+
+
+def _build_ingest_queue():
+    from ingest_jobs import IngestJobQueue
+    return IngestJobQueue()
+
+
+def _build_upload_store():
+    from upload_store import UploadStore
+    return UploadStore()
+
+
+def _build_graph():
+    from graph_builder import build_graph
+    return build_graph(checkpointer=get_checkpointer())
+
+
+registry.register("embeddings", _build_embeddings)
+registry.register("llm", _build_llm)
+registry.register("ocr_engine", _build_ocr_engine)
+registry.register("chroma_client", _build_chroma_client)
+registry.register("checkpointer", _build_checkpointer)
+registry.register("ingest_queue", _build_ingest_queue)
+registry.register("upload_store", _build_upload_store)
+registry.register("graph", _build_graph)
+
+# Per-file entries would otherwise pile up for every document ever queried
+registry.limit("vectorstore:", REGISTRY_MAX_VECTORSTORES)
+registry.limit("bm25:", REGISTRY_MAX_BM25_INDEXES)
+registry.limit("table:", REGISTRY_MAX_TABLES)
+registry.pin(f"vectorstore:{CORPUS_COLLECTION_NAME}")
+registry.pin(f"bm25:{CORPUS_COLLECTION_NAME}")
+
+
+def get_embeddings():
+    return registry.get("embeddings")
+
+
+def get_llm():
+    # Built on first use, so importing the tools needs neither Groq nor an API key
+    return registry.get("llm")
+
+
+def set_llm(llm) -> None:
+    # Injection hook: benchmarks and offline runs install any LangChain chat model here
+    registry.put("llm", llm)
+
+
+def get_ocr_engine():
+    return registry.get("ocr_engine")
+
+
+def get_chroma_client():
+    return registry.get("chroma_client")
+
+
+CHROMA_COMPLETE_KEY = "complete" # Collection metadata set once a file's ingest has finished
+
+
+def uses_flat_store(collection_name: str) -> bool:
+    return VECTOR_BACKEND == "flat" and collection_name != CORPUS_COLLECTION_NAME
+
+
+def get_vectorstore(collection_name: str):
+    # One store per collection, all sharing the same embedder (and Chroma client)
+    def _build_vectorstore():
+        if uses_flat_store(collection_name):
+            from flat_store import open_flat_store
+            return open_flat_store(collection_name, get_embeddings())
+        from langchain_chroma import Chroma
+        return Chroma(
+            client=get_chroma_client(),
+            collection_name=collection_name,
+            embedding_function=get_embeddings(),
+            persist_directory=CHROMA_DB_PERSIST_DIR # Must match the client's path
+        )
+    return registry.get(f"vectorstore:{collection_name}", _build_vectorstore)
+
+
+def get_bm25_index(collection_name: str):
+    # Persisted BM25 index for a collection (built from the stored chunks if it is missing)
+    def _build_bm25_index():
+        from bm25_index import load_or_build_bm25
+        return load_or_build_bm25(collection_name, get_vectorstore(collection_name))
+    return registry.get(f"bm25:{collection_name}", _build_bm25_index)
+
+
+def _chroma_collection(collection_name: str):
+    try:
+        # get_collection raises if the collection doesn't exist
+        return get_chroma_client().get_collection(name=collection_name)
+    except Exception:
+        return None
+
+
+def vectorstore_exists(collection_name: str) -> bool:
+    # Only collections whose ingest ran to completion count (see finish_vectorstore())
+    if uses_flat_store(collection_name):
+        from flat_store import flat_store_exists
+        return flat_store_exists(collection_name)
+    collection = _chroma_collection(collection_name)
+    return collection is not None and bool((collection.metadata or {}).get(CHROMA_COMPLETE_KEY))
+
+
+def prepare_vectorstore(collection_name: str):
+    # Store to ingest a new file into. A collection left incomplete by an interrupted ingest
+    # (e.g. the process was killed between two batches) is discarded first, so its chunks are
+    # not mixed with the new ones.
+    if uses_flat_store(collection_name):
+        from flat_store import flat_store_path
+        leftover = os.path.exists(flat_store_path(collection_name))
+    else:
+        leftover = _chroma_collection(collection_name) is not None
+    if leftover and not vectorstore_exists(collection_name):
+        drop_vectorstore(collection_name)
+    return get_vectorstore(collection_name)
+
+
+def finish_vectorstore(collection_name: str, vectordb) -> None:
+    # Marks a fully ingested store as complete: a marker file for flat stores, collection
+    # metadata for Chroma. A flat store is put back in the registry: if its entry was evicted
+    # during a long ingest, a copy reopened meanwhile would only know the rows committed then.
+    if uses_flat_store(collection_name):
+        vectordb.mark_complete()
+        registry.put(f"vectorstore:{collection_name}", vectordb)
+        return
+    collection = get_chroma_client().get_collection(name=collection_name)
+    # hnsw:* settings cannot be passed to modify() again
+    metadata = {key: value for key, value in (collection.metadata or {}).items() if not key.startswith("hnsw:")}
+    collection.modify(metadata={**metadata, CHROMA_COMPLETE_KEY: True})
+
+
+def drop_vectorstore(collection_name: str) -> None:
+    # Deletes a collection (e.g. after a failed ingest) and forgets its cached wrapper and BM25 index
+    from bm25_index import append_log_path, bm25_index_path
+    registry.evict(f"vectorstore:{collection_name}")
+    registry.evict(f"bm25:{collection_name}")
+    for path in (bm25_index_path(collection_name), append_log_path(bm25_index_path(collection_name))):
+        if os.path.exists(path):
+            os.remove(path)
+    if uses_flat_store(collection_name):
+        import shutil
+        from flat_store import flat_store_path
+        shutil.rmtree(flat_store_path(collection_name), ignore_errors=True)
+        return
+    try:
+        get_chroma_client().delete_collection(name=collection_name)
+    except Exception as e:
+        logging.warning(f"Could not delete collection '{collection_name}': {e}")
+
+
+def get_checkpointer():
+    return registry.get("checkpointer")
+
+
+def get_ingest_queue():
+    return registry.get("ingest_queue")
+
+
+def get_upload_store():
+    return registry.get("upload_store")
+
+
+def get_graph():
+    return registry.get("graph")
@@ -0,0 +1,61 @@
+# retrieval.py
+# Hybrid retrieval: vector similarity and BM25 lexical search, fused with reciprocal rank
+# fusion (RRF). Each stage has its own k and is timed separately.
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from config import RETRIEVAL_K_FINAL, RETRIEVAL_K_LEXICAL, RETRIEVAL_K_VECTOR, RRF_K
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k_final: int, rrf_k: int = RRF_K) -> List[Document]:
+    # Documents are identified by their text: the same chunk comes back from both stages
+    scores: Dict[str, float] = {}
+    by_text: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc.page_content] = scores.get(doc.page_content, 0.0) + 1.0 / (rrf_k + rank)
+            by_text.setdefault(doc.page_content, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k_final]
+    return [by_text[text] for text in best]
+
+
+def hybrid_search(
+    vectordb,
+    query: str,
+    query_embedding: List[float],
+    bm25_index: Optional[Any] = None,
+    k_vector: int = RETRIEVAL_K_VECTOR,
+    k_lexical: int = RETRIEVAL_K_LEXICAL,
+    k_final: int = RETRIEVAL_K_FINAL,
+    where: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Document], Dict[str, float]]:
+    """
+    Returns (top k_final documents, per-stage latency in ms).
+    Without a BM25 index this is plain vector search. `where` is a Chroma metadata
+    filter (used by the shared corpus collection to scope a query to some files).
+    """
+    timings: Dict[str, float] = {}
+
+    start = time.perf_counter()
+    vector_docs = vectordb.similarity_search_by_vector(query_embedding, k=k_vector, filter=where)
+    timings["vector_ms"] = (time.perf_counter() - start) * 1000
+
+    if bm25_index is None:
+        return vector_docs[:k_final], timings
+
+    start = time.perf_counter()
+    lexical_docs = [doc for doc, _ in bm25_index.search(query, k=k_lexical, where=where)]
+    timings["lexical_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    fused = reciprocal_rank_fusion([vector_docs, lexical_docs], k_final)
+    timings["fusion_ms"] = (time.perf_counter() - start) * 1000
+
+    logging.info(
+        f"Hybrid retrieval: {len(vector_docs)} vector + {len(lexical_docs)} lexical -> {len(fused)} fused "
+        f"({', '.join(f'{name}={value:.1f}' for name, value in timings.items())})"
+    )
+    return fused, timings
@@ -0,0 +1,109 @@
+# streaming.py
+# Token streaming from the LLM through LangGraph to the UI. Reasoning models wrap their
+# chain of thought in <think>...</think>; ThinkTagFilter removes it incrementally, even
+# when a tag is split across chunks, so users see the answer as soon as it starts.
+import logging
+import time
+from typing import Any, Callable, Tuple
+
+from context_assembler import count_tokens
+from tracing import active, count, span
+
+OPEN_TAG = "<think>"
+CLOSE_TAG = "</think>"
+
+
+def _partial_tag_length(text: str, tag: str) -> int:
+    # Length of the longest suffix of `text` that could be the start of `tag`
+    for length in range(min(len(text), len(tag) - 1), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ThinkTagFilter:
+    """
+    Stateful parser: feed() raw chunks, get back only the text outside <think> blocks.
+    Leading whitespace of the answer is dropped, like .strip() on the full response.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_think = False
+        self._started = False
+
+    def feed(self, text: str) -> str:
+        self._buffer += text
+        visible = []
+        while self._buffer:
+            tag = CLOSE_TAG if self._in_think else OPEN_TAG
+            index = self._buffer.find(tag)
+            if index >= 0:
+                if not self._in_think:
+                    visible.append(self._buffer[:index])
+                self._buffer = self._buffer[index + len(tag):]
+                self._in_think = not self._in_think
+                continue
+
+            # Hold back a possible partial tag until the next chunk decides it
+            keep = _partial_tag_length(self._buffer, tag)
+            if not self._in_think:
+                visible.append(self._buffer[:len(self._buffer) - keep])
+            self._buffer = self._buffer[len(self._buffer) - keep:]
+            break
+        return self._emit("".join(visible))
+
+    def flush(self) -> str:
+        # An unterminated <think> block is reasoning, never answer text
+        remaining = "" if self._in_think else self._buffer
+        self._buffer = ""
+        return self._emit(remaining)
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+
+def get_token_writer() -> Callable[[Any], None]:
+    # Inside graph.stream(..., stream_mode="custom") this forwards to the caller;
+    # anywhere else (plain invoke, direct calls) tokens are simply dropped.
+    try:
+        from langgraph.config import get_stream_writer
+        return get_stream_writer()
+    except Exception:
+        return lambda chunk: None
+
+
+def stream_answer(llm, prompt) -> Tuple[str, str]:
+    """
+    Streams `prompt` through `llm`, writing visible tokens to the graph's custom stream
+    as {"token": text} as they arrive. Returns (answer without reasoning, raw response).
+    """
+    writer = get_token_writer()
+    think_filter = ThinkTagFilter()
+    raw_parts = []
+    visible_parts = []
+
+    started = time.perf_counter()
+    with span("llm"):
+        for chunk in llm.stream(prompt):
+            if not raw_parts:
+                count("llm_first_token_ms", (time.perf_counter() - started) * 1000)
+            raw_parts.append(chunk.content)
+            visible = think_filter.feed(chunk.content)
+            if visible:
+                visible_parts.append(visible)
+                writer({"token": visible})
+
+    tail = think_filter.flush()
+    if tail:
+        visible_parts.append(tail)
+        writer({"token": tail})
+
+    raw_response = "".join(raw_parts)
+    if active():
+        count("completion_tokens", count_tokens(raw_response)) # Includes <think> reasoning: it is billed too
+    logging.debug(f"Streamed {len(raw_parts)} chunks ({len(raw_response)} chars).")
+    return "".join(visible_parts).strip(), raw_response
@@ -0,0 +1,260 @@
+# table_tool.py
+# Structured QA over CSV/XLSX files. The LLM only translates the question into a small,
+# restricted JSON query; the query itself runs as vectorized pandas over a cached
+# columnar (Parquet) copy of the sheet, so counts/sums/filters are exact and fast.
+import json
+import logging
+import os
+import re
+from typing import Any, Dict
+
+import pandas as pd
+from langchain.schema.messages import AIMessage, HumanMessage
+
+from config import TABLE_CACHE_DIR
+from context_assembler import count_tokens
+from resources import get_llm, registry
+from tracing import active, count, span
+
+FILTER_OPS = {"==", "!=", ">", ">=", "<", "<=", "contains", "startswith", "endswith", "in", "isnull", "notnull"}
+OPERATIONS = {"count", "sum", "mean", "min", "max", "unique", "value_counts", "rows"}
+MAX_ROWS_IN_ANSWER = 50
+
+
+class TableQueryError(ValueError):
+    """Raised when a query spec is malformed or refers to unknown columns/operators."""
+
+
+# --- Columnar cache ---
+
+def _read_source(file_path: str) -> pd.DataFrame:
+    if file_path.lower().endswith(".csv"):
+        return pd.read_csv(file_path)
+    return pd.read_excel(file_path)
+
+
+def load_table(file_path: str, file_hash: str) -> pd.DataFrame:
+    """
+    Returns the sheet as a DataFrame. Parsed once per content hash: kept in the process
+    registry and persisted as Parquet so later processes skip CSV/XLSX parsing.
+    """
+    def _build_table():
+        parquet_path = os.path.join(TABLE_CACHE_DIR, f"{file_hash}.parquet")
+        if os.path.exists(parquet_path):
+            return pd.read_parquet(parquet_path)
+
+        df = _read_source(file_path)
+        try:
+            os.makedirs(TABLE_CACHE_DIR, exist_ok=True)
+            # Parquet needs string column names
+            df.columns = [str(column) for column in df.columns]
+            df.to_parquet(parquet_path, index=False)
+        except Exception as e: # pyarrow missing or a column type Parquet can't hold
+            logging.warning(f"Table cache: could not write Parquet for '{file_path}': {e}")
+        return df
+
+    return registry.get(f"table:{file_hash}", _build_table)
+
+
+# --- Restricted query language ---
+
+def _column(df: pd.DataFrame, name: Any) -> pd.Series:
+    if name not in df.columns:
+        raise TableQueryError(f"Unknown column: {name!r}")
+    return df[name]
+
+
+def _as_number(value: Any) -> Any:
+    # Numbers and numeric strings ("1", "2.5") as numbers; anything else as None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value) if any(c in value for c in ".eE") else int(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _filter_mask(df: pd.DataFrame, spec: Dict[str, Any]) -> pd.Series:
+    if not isinstance(spec, dict):
+        raise TableQueryError(f"Filter must be an object, got {spec!r}")
+    op = spec.get("op")
+    if op not in FILTER_OPS:
+        raise TableQueryError(f"Unsupported filter operator: {op!r}")
+    series = _column(df, spec.get("column"))
+    value = spec.get("value")
+
+    if op == "isnull":
+        return series.isna()
+    if op == "notnull":
+        return series.notna()
+
+    if op in {"contains", "startswith", "endswith"}:
+        text = series.astype(str)
+        needle = str(value)
+        if not spec.get("case_sensitive", False):
+            text = text.str.lower()
+            needle = needle.lower()
+        if op == "contains":
+            return text.str.contains(needle, regex=False)
+        if op == "startswith":
+            return text.str.startswith(needle)
+        return text.str.endswith(needle)
+
+    if op == "in":
+        if not isinstance(value, list):
+            raise TableQueryError("'in' expects a list value")
+        return series.isin(value) | series.astype(str).isin([str(v) for v in value])
+
+    # Comparisons: numeric when the value is (or spells) a number, otherwise case-insensitive text
+    number = _as_number(value)
+    if number is not None and (op not in {"==", "!="} or pd.api.types.is_numeric_dtype(series)):
+        series = pd.to_numeric(series, errors="coerce")
+        value = number
+    elif op in {"==", "!="}:
+        series = series.astype(str).str.lower()
+        value = str(value).lower()
+
+    try:
+        return {
+            "==": series.eq, "!=": series.ne, ">": series.gt,
+            ">=": series.ge, "<": series.lt, "<=": series.le,
+        }[op](value).fillna(False)
+    except TypeError as e:
+        raise TableQueryError(f"Cannot compare column {spec.get('column')!r} with {value!r}: {e}")
+
+
+def execute_query(df: pd.DataFrame, query: Dict[str, Any]) -> Any:
+    """
+    Runs a validated query spec against `df` and returns a scalar, list or DataFrame.
+
+    Spec: {"filters": [{"column", "op", "value"}], "operation": one of OPERATIONS,
+           "column": target column (optional for count/rows), "group_by": column (optional), "limit": int}
+    """
+    if not isinstance(query, dict):
+        raise TableQueryError(f"Query must be an object, got {query!r}")
+    operation = query.get("operation")
+    if operation not in OPERATIONS:
+        raise TableQueryError(f"Unsupported operation: {operation!r}")
+
+    mask = pd.Series(True, index=df.index)
+    for spec in query.get("filters") or []:
+        mask &= _filter_mask(df, spec)
+    selected = df[mask]
+
+    try:
+        limit = max(1, min(int(query.get("limit") or MAX_ROWS_IN_ANSWER), MAX_ROWS_IN_ANSWER))
+    except (TypeError, ValueError):
+        raise TableQueryError(f"Invalid limit: {query.get('limit')!r}")
+    column = query.get("column")
+    group_by = query.get("group_by")
+
+    if operation == "rows":
+        return selected.head(limit)
+
+    if operation == "count" and not column:
+        if group_by:
+            return selected.groupby(_column(selected, group_by)).size()
+        return int(len(selected))
+
+    target = _column(selected, column)
+    if operation in {"sum", "mean", "min", "max"}:
+        numeric = pd.to_numeric(target, errors="coerce")
+        if group_by:
+            return getattr(numeric.groupby(_column(selected, group_by)), operation)()
+        result = getattr(numeric, operation)()
+        return None if pd.isna(result) else result.item() if hasattr(result, "item") else result
+    if operation == "count":
+        if group_by:
+            return target.groupby(_column(selected, group_by)).count()
+        return int(target.count())
+    if operation == "unique":
+        return target.dropna().unique().tolist()[:limit]
+    return target.value_counts().head(limit) # value_counts
+
+
+def format_result(result: Any) -> str:
+    if isinstance(result, pd.DataFrame):
+        return "No matching rows." if result.empty else result.to_string(index=False)
+    if isinstance(result, pd.Series):
+        return "No matching rows." if result.empty else result.to_string()
+    if isinstance(result, list):
+        return ", ".join(str(item) for item in result) if result else "No matching values."
+    if result is None:
+        return "No matching numeric values."
+    return str(result)
+
+
+# --- Question -> query translation ---
+
+def build_query_prompt(df: pd.DataFrame, question: str) -> str:
+    columns = ", ".join(f"{name} ({dtype})" for name, dtype in df.dtypes.astype(str).items())
+    sample = df.head(3).to_string(index=False)
+    return (
+        "Translate the question into a JSON query over a table. Respond with ONLY the JSON object.\n"
+        'Schema: {"filters": [{"column": str, "op": str, "value": any}], "operation": str, '
+        '"column": str or null, "group_by": str or null, "limit": int or null}\n'
+        f"Allowed ops: {', '.join(sorted(FILTER_OPS))}\n"
+        f"Allowed operations: {', '.join(sorted(OPERATIONS))}\n"
+        'If the question cannot be answered with this schema, respond with {"unsupported": true}.\n\n'
+        f"Columns: {columns}\n"
+        f"Sample rows:\n{sample}\n\n"
+        f"Question: {question}\nJSON:"
+    )
+
+
+def parse_query(text: str) -> Dict[str, Any]:
+    text = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
+    match = re.search(r"\{.*\}", text, flags=re.DOTALL)
+    if not match:
+        raise TableQueryError("LLM did not return a JSON query")
+    try:
+        query = json.loads(match.group(0))
+    except ValueError as e:
+        raise TableQueryError(f"LLM returned invalid JSON: {e}")
+    if not isinstance(query, dict):
+        raise TableQueryError("LLM did not return a JSON object")
+    return query
+
+
+def table_tool_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Langgraph node answering questions about CSV/XLSX files with an exact pandas query.
+    Falls back to the RAG tool when the question does not fit the query language.
+    """
+    question = state.get("input", "")
+    file_path = state.get("file_path", "")
+    file_hash = state.get("last_processed_file_hash")
+
+    try:
+        with span("table_load"):
+            df = load_table(file_path, file_hash)
+        prompt = build_query_prompt(df, question)
+        if active():
+            count("prompt_tokens", count_tokens(prompt))
+        with span("llm"):
+            response = get_llm().invoke(prompt)
+        if active():
+            count("completion_tokens", count_tokens(response.content))
+        query = parse_query(response.content)
+        if query.get("unsupported"):
+            raise TableQueryError("question is outside the table query language")
+        logging.info(f"Table Tool: executing query {query}")
+        with span("query"):
+            answer = format_result(execute_query(df, query))
+    except TableQueryError as e:
+        logging.info(f"Table Tool: {e}. Falling back to RAG.")
+        from rag_tool import rag_tool_node
+        return rag_tool_node(state)
+    except Exception as e:
+        logging.error(f"Table Tool Error: {e}")
+        return {**state, "answer": f"Error querying table: {e}"}
+
+    # Same turn bookkeeping as the RAG tool, so follow-up questions keep the table turns
+    chat_history = list(state.get("chat_history") or []) # Checkpointed values must not be mutated in place
+    chat_history.append(HumanMessage(content=question))
+    chat_history.append(AIMessage(content=answer))
+    return {**state, "answer": answer, "chat_history": chat_history}
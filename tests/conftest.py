@@ -0,0 +1,34 @@
+# tests/conftest.py
+# The app keeps its indexes and caches under paths relative to the working directory, and
+# some caches are created at import time, so the tests move into a scratch directory before
+# any app module is imported. Groq and the embedding model are replaced by the offline fakes
+# from benchmarks/fakes.py.
+import os
+import sys
+import tempfile
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+os.chdir(tempfile.mkdtemp(prefix="rag_tests_"))
+
+from embedding_cache import CachedEmbeddings # noqa: E402
+from fakes import FakeChatModel, HashingEmbeddings # noqa: E402
+from resources import registry, set_llm # noqa: E402
+
+DATA_DIR = os.path.join(REPO_ROOT, "Data")
+
+
+@pytest.fixture(autouse=True)
+def offline_models():
+    registry.put("embeddings", CachedEmbeddings(HashingEmbeddings(), "hashing-384"))
+    set_llm(FakeChatModel(first_token_latency_s=0, token_latency_s=0))
+    yield
+
+
+@pytest.fixture
+def graph():
+    from resources import get_graph
+    return get_graph()
@@ -0,0 +1,47 @@
+# tests/test_answer_cache.py
+import answer_cache as answer_cache_module
+from answer_cache import SemanticAnswerCache
+
+
+def vector(i):
+    return [1.0 if j == i else 0.0 for j in range(8)]
+
+
+def test_answers_survive_a_restart(tmp_path):
+    path = str(tmp_path / "answers.jsonl")
+    cache = SemanticAnswerCache(path=path)
+    cache.put("doc_a", "What is the code?", vector(0), "ZX-1")
+    cache.put("doc_a", "Who wrote it?", vector(1), "Ada")
+    cache.flush()
+
+    reloaded = SemanticAnswerCache(path=path)
+    assert reloaded.lookup("doc_a", vector(1)) == "Ada"
+    assert reloaded.lookup("doc_b", vector(1)) is None
+
+
+def test_collection_cap_drops_least_recently_used(tmp_path):
+    path = str(tmp_path / "answers.jsonl")
+    cache = SemanticAnswerCache(path=path, max_collections=2)
+    cache.put("doc_a", "q", vector(0), "a")
+    cache.put("doc_b", "q", vector(0), "b")
+    assert cache.lookup("doc_a", vector(0)) == "a" # doc_b is now the least recently used
+    cache.put("doc_c", "q", vector(0), "c")
+    cache.flush()
+
+    assert cache.lookup("doc_b", vector(0)) is None
+    # Only writes are logged, so after a restart recency is by last answer stored
+    reloaded = SemanticAnswerCache(path=path, max_collections=2)
+    assert reloaded.lookup("doc_a", vector(0)) is None
+    assert reloaded.lookup("doc_c", vector(0)) == "c"
+
+
+def test_log_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_cache_module, "COMPACT_MIN_LINES", 10)
+    path = tmp_path / "answers.jsonl"
+    cache = SemanticAnswerCache(path=str(path), max_entries=3)
+    for i in range(40):
+        cache.put("doc_a", f"question {i}", vector(i % 8), f"answer {i}")
+        cache.flush()
+
+    assert len(path.read_text().splitlines()) < 10
+    assert SemanticAnswerCache(path=str(path)).lookup("doc_a", vector(39 % 8)) == "answer 39"
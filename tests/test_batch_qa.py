@@ -0,0 +1,22 @@
+# tests/test_batch_qa.py
+import asyncio
+
+import nodes.upload_node as upload_node
+from batch_qa import BatchRunner
+
+
+def test_failed_file_is_ingested_once_and_reported_as_error(tmp_path, monkeypatch):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    submitted = []
+    queue = upload_node.get_ingest_queue()
+    original_submit = queue.submit
+    monkeypatch.setattr(queue, "submit", lambda *args: submitted.append(args) or original_submit(*args))
+
+    pairs = [(str(broken), question) for question in ("What is this?", "Who wrote it?", "When?")]
+    results = asyncio.run(BatchRunner(concurrency=2).run(pairs))
+
+    assert len(submitted) == 1
+    assert len(results) == 3
+    assert all(record["error"].startswith("Error loading document") for record in results)
+    assert not any("answer" in record for record in results)
@@ -0,0 +1,76 @@
+# tests/test_bm25_index.py
+import os
+import threading
+
+from langchain.schema import Document
+
+from bm25_index import BM25Index, append_log_path, matches_filter
+
+
+def test_search_while_another_thread_adds_and_removes():
+    index = BM25Index()
+    errors = []
+    done = threading.Event()
+
+    def write():
+        for i in range(300):
+            index.add_documents([Document(page_content=f"shared term{i} word{i % 17}", metadata={"file_hash": str(i % 5)})])
+            if i % 25 == 0:
+                index.remove_where({"file_hash": "1"})
+        done.set()
+
+    def read():
+        while not done.is_set():
+            try:
+                index.search("shared word3 word7", k=5, where={"file_hash": {"$in": ["0", "2"]}})
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    writer = threading.Thread(target=write)
+    for thread in readers + [writer]:
+        thread.start()
+    for thread in readers + [writer]:
+        thread.join()
+
+    assert not errors
+    assert all(doc.metadata["file_hash"] in ("0", "2") for doc, _ in index.search("shared", k=50, where={"file_hash": {"$in": ["0", "2"]}}))
+
+
+def _file_docs(file_hash, count):
+    return [Document(page_content=f"invoice {file_hash} line {i} total", metadata={"file_hash": file_hash}) for i in range(count)]
+
+
+def test_scoped_search_matches_filtered_search():
+    index = BM25Index()
+    for file_hash in ("a", "b", "c"):
+        index.add_documents(_file_docs(file_hash, 20))
+
+    for where in ({"file_hash": "b"}, {"file_hash": {"$in": ["a", "c"]}}, {"file_hash": "missing"}):
+        scoped = index.search("invoice total line 3", k=50, where=where)
+        expected = [doc for doc in index.docs if matches_filter(doc["metadata"], where)]
+        assert len(scoped) == min(50, len(expected))
+        assert all(matches_filter(doc.metadata, where) for doc, _ in scoped)
+
+
+def test_persist_appends_new_documents_and_reloads(tmp_path):
+    path = str(tmp_path / "corpus.json")
+    index = BM25Index()
+    index.add_documents(_file_docs("a", 5))
+    index.persist(path) # No snapshot yet: full save
+    snapshot_size = os.path.getsize(path)
+
+    index.add_documents(_file_docs("b", 3))
+    index.persist(path)
+    assert os.path.getsize(path) == snapshot_size # Only the log grew
+    assert len(open(append_log_path(path)).readlines()) == 3
+
+    reloaded = BM25Index.load(path)
+    assert len(reloaded) == 8
+    assert [doc.metadata["file_hash"] for doc, _ in reloaded.search("invoice", k=10, where={"file_hash": "b"})] == ["b"] * 3
+
+    index.remove_where({"file_hash": "a"})
+    index.persist(path) # Removals rewrite the snapshot
+    assert not os.path.exists(append_log_path(path))
+    assert len(BM25Index.load(path)) == 3
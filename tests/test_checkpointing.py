@@ -0,0 +1,41 @@
+# tests/test_checkpointing.py
+import uuid
+
+import nodes.upload_node as upload_node
+from checkpointing import session_config
+
+
+def test_follow_up_question_skips_hashing_and_ingestion(graph, tmp_path, monkeypatch):
+    document = tmp_path / "notes.txt"
+    document.write_text("The warehouse in Lisbon stores spare turbine blades. " * 40)
+
+    hash_calls = []
+    original_hash = upload_node.calculate_file_hash
+    monkeypatch.setattr(upload_node, "calculate_file_hash", lambda path: hash_calls.append(path) or original_hash(path))
+    submitted = []
+    queue = upload_node.get_ingest_queue()
+    original_submit = queue.submit
+    monkeypatch.setattr(queue, "submit", lambda *args: submitted.append(args) or original_submit(*args))
+
+    config = session_config(uuid.uuid4().hex)
+    first = graph.invoke({"input": "Where are the turbine blades?", "file_path": str(document)}, config=config)
+    second = graph.invoke({"input": "What does the warehouse store?", "file_path": str(document)}, config=config)
+
+    assert len(hash_calls) == 1
+    assert len(submitted) == 1
+    assert first["active_collection_name"] == second["active_collection_name"]
+    assert len(second["chat_history"]) == 4
+
+
+def test_failed_upload_does_not_answer_from_previous_file(graph, tmp_path):
+    document = tmp_path / "good.txt"
+    document.write_text("Cats sleep for most of the day. " * 40)
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+
+    config = session_config(uuid.uuid4().hex)
+    graph.invoke({"input": "What do cats do?", "file_path": str(document)}, config=config)
+    result = graph.invoke({"input": "What is in this file?", "file_path": str(broken)}, config=config)
+
+    assert result["answer"].startswith("Error loading document")
+    assert result["active_collection_name"] is None
@@ -0,0 +1,22 @@
+# tests/test_context_assembler.py
+import pytest
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from context_assembler import merge_chunks
+
+TEXT = " ".join(f"Sentence number {i} is about topic {i % 7}." for i in range(60))
+CHUNKS = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=60).split_text(TEXT)
+
+
+@pytest.mark.parametrize("order", [[0, 1, 2], [2, 0, 1], [1, 2, 0], [2, 1, 0]])
+def test_adjacent_chunks_collapse_in_any_rank_order(order):
+    blocks = merge_chunks([CHUNKS[i] for i in order])
+    assert len(blocks) == 1
+    assert TEXT.startswith(blocks[0])
+    assert CHUNKS[2] in blocks[0]
+
+
+def test_blocks_keep_rank_of_their_best_chunk():
+    blocks = merge_chunks([CHUNKS[5], CHUNKS[2], CHUNKS[0], CHUNKS[1]])
+    assert blocks[0] == CHUNKS[5]
+    assert blocks[1].startswith(CHUNKS[0]) and blocks[1].endswith(CHUNKS[2])
@@ -0,0 +1,38 @@
+# tests/test_resources.py
+from resources import ResourceRegistry, finish_vectorstore, prepare_vectorstore, registry, vectorstore_exists
+
+
+def test_limited_prefix_evicts_least_recently_used():
+    registry = ResourceRegistry()
+    registry.limit("bm25:", 2)
+    registry.pin("bm25:corpus")
+    builds = []
+
+    def get(name):
+        return registry.get(name, lambda: builds.append(name) or name)
+
+    get("bm25:corpus")
+    get("bm25:a")
+    get("bm25:b")
+    get("bm25:a") # a is now more recent than b
+    get("bm25:c") # evicts b
+    registry.put("graph", object()) # other prefixes are unbounded
+
+    assert set(registry.stats()) == {"bm25:corpus", "bm25:a", "bm25:c", "graph"}
+    get("bm25:b")
+    assert builds == ["bm25:corpus", "bm25:a", "bm25:b", "bm25:c", "bm25:b"]
+    assert "bm25:corpus" in registry.stats()
+
+
+def test_interrupted_chroma_ingest_is_not_indexed():
+    collection_name = "doc_interrupted"
+    vectordb = prepare_vectorstore(collection_name)
+    vectordb.add_texts(["first batch of an ingest that never finished"])
+    registry.evict(f"vectorstore:{collection_name}") # As after a restart
+    assert not vectorstore_exists(collection_name)
+
+    vectordb = prepare_vectorstore(collection_name) # Drops the leftover
+    vectordb.add_texts(["the whole file"])
+    finish_vectorstore(collection_name, vectordb)
+    assert vectorstore_exists(collection_name)
+    assert vectordb.get()["documents"] == ["the whole file"]
@@ -0,0 +1,67 @@
+# tests/test_streaming.py
+import uuid
+
+import pytest
+from fakes import FakeChatModel
+from langchain_core.messages import HumanMessage
+
+from checkpointing import session_config
+from streaming import ThinkTagFilter, stream_answer
+
+RAW = "<think>The user asks about x < y.</think>\n\nThe answer is a < b, not <think."
+
+
+def filtered(chunks):
+    think_filter = ThinkTagFilter()
+    return "".join(think_filter.feed(chunk) for chunk in chunks) + think_filter.flush()
+
+
+@pytest.mark.parametrize("first", range(len(RAW) + 1))
+def test_tags_split_at_any_offset(first):
+    expected = "The answer is a < b, not <think."
+    assert filtered([RAW[:first], RAW[first:]]) == expected
+    # Two cuts, including ones that split both tags
+    for second in range(first, len(RAW) + 1, 7):
+        assert filtered([RAW[:first], RAW[first:second], RAW[second:]]) == expected
+
+
+def test_one_character_chunks():
+    assert filtered(list(RAW)) == "The answer is a < b, not <think."
+
+
+def test_unterminated_think_block_is_dropped():
+    assert filtered(["Short answer. <think>still reason", "ing about it"]) == "Short answer. "
+    assert filtered(["<think>never closed"]) == ""
+
+
+def test_angle_brackets_in_answer_are_kept():
+    assert filtered(["if a <", "b then <thi", "s> or </th", "ink>"]) == "if a <b then <this> or </think>"
+    assert filtered(["x <"]) == "x <"
+
+
+def test_stream_answer_filters_reasoning():
+    llm = FakeChatModel(first_token_latency_s=0, token_latency_s=0, completion_tokens=10)
+    answer, raw = stream_answer(llm, [HumanMessage(content="question")])
+    assert raw.startswith("<think>")
+    assert "<think>" not in answer and "reasoning" not in answer
+    assert len(answer.split()) == 8
+
+
+def test_graph_stream_yields_filtered_tokens(graph, tmp_path):
+    document = tmp_path / "doc.txt"
+    document.write_text("Streaming answers token by token keeps the interface responsive. " * 30)
+
+    tokens, result = [], {}
+    for mode, chunk in graph.stream(
+        {"input": "Why stream tokens?", "file_path": str(document)},
+        config=session_config(uuid.uuid4().hex),
+        stream_mode=["custom", "values"],
+    ):
+        if mode == "custom" and "token" in chunk:
+            tokens.append(chunk["token"])
+        elif mode == "values":
+            result.update(chunk)
+
+    assert len(tokens) > 1
+    assert "<think>" not in "".join(tokens)
+    assert "".join(tokens).strip() == result["answer"]
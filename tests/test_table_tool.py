@@ -0,0 +1,99 @@
+# tests/test_table_tool.py
+import json
+import os
+
+import pandas as pd
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import rag_tool
+import table_tool
+import tracing
+from conftest import DATA_DIR
+from table_tool import TableQueryError, execute_query, table_tool_node
+from upload_store import hash_file
+
+NAMES_CSV = os.path.join(DATA_DIR, "CSV_Excel", "names.csv")
+
+
+@pytest.fixture
+def names():
+    return pd.read_csv(NAMES_CSV)
+
+
+def query(operation="count", filters=None, **fields):
+    return {"filters": filters or [], "operation": operation, **fields}
+
+
+def test_count(names):
+    assert execute_query(names, query()) == len(names)
+
+
+def test_startswith_is_case_insensitive(names):
+    result = execute_query(names, query("rows", [{"column": "Company", "op": "startswith", "value": "g"}]))
+    assert result["Company"].tolist() == ["Google"]
+
+
+def test_count_group_by(names):
+    result = execute_query(names, query(group_by="Company"))
+    assert result.to_dict() == {company: 1 for company in names["Company"]}
+
+
+def test_numeric_strings_are_compared_as_numbers():
+    df = pd.DataFrame({"amount": [1, 5, 10]})
+    assert execute_query(df, query(filters=[{"column": "amount", "op": ">", "value": "4"}])) == 2
+    assert execute_query(df, query(filters=[{"column": "amount", "op": "==", "value": "10"}])) == 1
+
+
+@pytest.mark.parametrize("bad_query", [
+    query(filters=[{"column": "amount", "op": ">", "value": "abc"}]),
+    query("rows", limit="abc"),
+    query(filters=["amount > 1"]),
+    query(filters=[{"column": "missing", "op": "==", "value": 1}]),
+    query("median"),
+    ["count"],
+])
+def test_malformed_queries_raise_table_query_error(bad_query):
+    df = pd.DataFrame({"amount": [1, 5, 10]})
+    with pytest.raises(TableQueryError):
+        execute_query(df, bad_query)
+
+
+def run_node(monkeypatch, llm_response):
+    monkeypatch.setattr(table_tool, "get_llm", lambda: FakeListChatModel(responses=[llm_response]))
+    rag_calls = []
+    monkeypatch.setattr(rag_tool, "rag_tool_node", lambda state: rag_calls.append(state) or {**state, "answer": "from rag"})
+    state = {"input": "question", "file_path": NAMES_CSV, "last_processed_file_hash": hash_file(NAMES_CSV)}
+    return table_tool_node(state), rag_calls
+
+
+def test_node_answers_count(monkeypatch):
+    result, rag_calls = run_node(monkeypatch, "<think>count rows</think>" + json.dumps(query()))
+    assert result["answer"] == "3"
+    assert not rag_calls
+    assert [message.content for message in result["chat_history"]] == ["question", "3"]
+
+
+def test_node_counts_prompt_and_completion_tokens(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", True)
+    with tracing.trace_task("table_tool") as record:
+        run_node(monkeypatch, json.dumps(query()))
+    assert record.counters["prompt_tokens"] > 0
+    assert record.counters["completion_tokens"] > 0
+
+
+def test_node_answers_startswith(monkeypatch):
+    response = json.dumps(query("unique", [{"column": "Product", "op": "startswith", "value": "Of"}], column="Company"))
+    result, _ = run_node(monkeypatch, response)
+    assert result["answer"] == "Microsoft"
+
+
+@pytest.mark.parametrize("response", [
+    '{"unsupported": true}',
+    "I cannot answer that.",
+    json.dumps(query(filters=[{"column": "Company", "op": ">", "value": 1}], limit="abc")),
+])
+def test_node_falls_back_to_rag(monkeypatch, response):
+    result, rag_calls = run_node(monkeypatch, response)
+    assert result["answer"] == "from rag"
+    assert len(rag_calls) == 1
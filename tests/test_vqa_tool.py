@@ -0,0 +1,22 @@
+# tests/test_vqa_tool.py
+import resources
+from resources import get_vectorstore
+from vqa_tool import relevant_ocr_text
+
+
+def _ocr_result(lines: int):
+    return {
+        "rec_texts": [f"line {i} of the scanned page" for i in range(lines)],
+        "rec_boxes": [[0, 20 * i, 100, 20 * i + 15] for i in range(lines)],
+        "rec_scores": [0.9] * lines,
+    }
+
+
+def test_ocr_lines_are_indexed_once_with_flat_backend(monkeypatch):
+    monkeypatch.setattr(resources, "VECTOR_BACKEND", "flat")
+    ocr_result = _ocr_result(60)
+
+    for _ in range(3):
+        assert relevant_ocr_text("what is on line 7?", ocr_result, "vqa_flat_once")
+
+    assert len(get_vectorstore("ocr_vqa_flat_once")) == 20
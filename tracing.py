@@ -0,0 +1,267 @@
+# tracing.py
+# Per-node tracing and metrics. build_graph() wraps every node with traced_node(); inside a
+# node, span("llm") / count("chunks", n) attribute time and counts to that node's record.
+# Finished records are appended to a JSONL trace file, kept in a small in-memory buffer for
+# the UI, and aggregated into Prometheus text metrics (optionally served over HTTP).
+# With RAG_TRACING unset, traced_node() returns the node unchanged and span()/count() are
+# a context-variable lookup that finds nothing.
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional
+
+from config import METRICS_PORT, TRACE_BUFFER_SIZE, TRACE_PATH, TRACING_ENABLED
+
+# Upper bounds (seconds) of the node latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current: contextvars.ContextVar[Optional["TraceRecord"]] = contextvars.ContextVar("trace_record", default=None)
+_NOOP = nullcontext()
+
+
+class TraceRecord:
+    """
+    Wall time, summed sub-span times and counters of one node run (or one background task).
+    """
+
+    def __init__(self, name: str, trace_id: str):
+        self.name = name
+        self.trace_id = trace_id
+        self.started_at = time.time()
+        self.wall_ms = 0.0
+        self.spans: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+        self.error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "node": self.name,
+            "started_at": self.started_at,
+            "wall_ms": round(self.wall_ms, 3),
+            "spans_ms": {name: round(value, 3) for name, value in self.spans.items()},
+            "counters": self.counters,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    def __init__(self, trace_path: str = TRACE_PATH, buffer_size: int = TRACE_BUFFER_SIZE):
+        self.trace_path = trace_path
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        # Prometheus aggregates
+        self._node_calls: Dict[str, int] = {}
+        self._node_errors: Dict[str, int] = {}
+        self._node_seconds: Dict[str, float] = {}
+        self._node_buckets: Dict[str, List[int]] = {}
+        self._span_seconds: Dict[tuple, float] = {}
+        self._span_calls: Dict[tuple, int] = {}
+        self._counters: Dict[tuple, float] = {}
+
+    def finish(self, record: TraceRecord) -> None:
+        entry = record.as_dict()
+        line = json.dumps(entry, default=str)
+        seconds = record.wall_ms / 1000
+        with self._lock:
+            self._recent.append(entry)
+            self._node_calls[record.name] = self._node_calls.get(record.name, 0) + 1
+            if record.error is not None:
+                self._node_errors[record.name] = self._node_errors.get(record.name, 0) + 1
+            self._node_seconds[record.name] = self._node_seconds.get(record.name, 0.0) + seconds
+            buckets = self._node_buckets.setdefault(record.name, [0] * len(LATENCY_BUCKETS))
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[index] += 1
+            for span_name, value in record.spans.items():
+                key = (record.name, span_name)
+                self._span_seconds[key] = self._span_seconds.get(key, 0.0) + value / 1000
+                self._span_calls[key] = self._span_calls.get(key, 0) + 1
+            for counter_name, value in record.counters.items():
+                key = (record.name, counter_name)
+                self._counters[key] = self._counters.get(key, 0) + value
+            if self.trace_path:
+                os.makedirs(os.path.dirname(self.trace_path) or ".", exist_ok=True)
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def recent(self, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [entry for entry in self._recent if trace_id is None or entry["trace_id"] == trace_id]
+
+    def render_metrics(self) -> str:
+        # Prometheus text exposition format (version 0.0.4)
+        lines = []
+        with self._lock:
+            lines += ["# HELP rag_node_calls_total Node executions.", "# TYPE rag_node_calls_total counter"]
+            lines += [f'rag_node_calls_total{{node="{node}"}} {value}' for node, value in self._node_calls.items()]
+            lines += ["# HELP rag_node_errors_total Node executions that raised.", "# TYPE rag_node_errors_total counter"]
+            lines += [f'rag_node_errors_total{{node="{node}"}} {value}' for node, value in self._node_errors.items()]
+            lines += ["# HELP rag_node_duration_seconds Node wall time.", "# TYPE rag_node_duration_seconds histogram"]
+            for node, buckets in self._node_buckets.items():
+                lines += [f'rag_node_duration_seconds_bucket{{node="{node}",le="{bound}"}} {observed}' for bound, observed in zip(LATENCY_BUCKETS, buckets)]
+                lines.append(f'rag_node_duration_seconds_bucket{{node="{node}",le="+Inf"}} {self._node_calls[node]}')
+                lines.append(f'rag_node_duration_seconds_sum{{node="{node}"}} {self._node_seconds[node]:.6f}')
+                lines.append(f'rag_node_duration_seconds_count{{node="{node}"}} {self._node_calls[node]}')
+            lines += ["# HELP rag_span_seconds_total Time spent in sub-spans, per node.", "# TYPE rag_span_seconds_total counter"]
+            lines += [f'rag_span_seconds_total{{node="{node}",span="{span}"}} {value:.6f}' for (node, span), value in self._span_seconds.items()]
+            lines += ["# HELP rag_span_calls_total Node runs that entered a sub-span.", "# TYPE rag_span_calls_total counter"]
+            lines += [f'rag_span_calls_total{{node="{node}",span="{span}"}} {value}' for (node, span), value in self._span_calls.items()]
+            lines += ["# HELP rag_events_total Counted events (chunks, tokens, cache hits), per node.", "# TYPE rag_events_total counter"]
+            lines += [f'rag_events_total{{node="{node}",event="{name}"}} {value:g}' for (node, name), value in self._counters.items()]
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer()
+
+
+# --- Recording (cheap no-ops outside a traced node) ---
+
+@contextmanager
+def _timed(record: TraceRecord, name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.spans[name] = record.spans.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def active() -> bool:
+    # For callers that would do extra work (e.g. counting tokens) only to record it
+    return _current.get() is not None
+
+
+def span(name: str):
+    """
+    Times a block and adds it to the current node's `name` span (repeated spans are summed).
+    """
+    record = _current.get()
+    if record is None:
+        return _NOOP
+    return _timed(record, name)
+
+
+def count(name: str, value: float = 1) -> None:
+    record = _current.get()
+    if record is not None:
+        record.counters[name] = record.counters.get(name, 0) + value
+
+
+def record_span(name: str, ms: float) -> None:
+    # For stages already timed elsewhere (e.g. the OCR pipeline's own timings)
+    record = _current.get()
+    if record is not None:
+        record.spans[name] = record.spans.get(name, 0.0) + ms
+
+
+def timed_iter(items: Iterable, name: str) -> Iterable:
+    # Attributes the time spent producing each item (e.g. a lazy loader reading pages) to `name`
+    record = _current.get()
+    if record is None:
+        return items
+    return _timed_iter(record, items, name)
+
+
+def _timed_iter(record: TraceRecord, items: Iterable, name: str) -> Iterator:
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            record.spans[name] = record.spans.get(name, 0.0) + (time.perf_counter() - start) * 1000
+        yield item
+
+
+@contextmanager
+def trace_task(name: str, trace_id: Optional[str] = None) -> Iterator[Optional[TraceRecord]]:
+    """
+    Records a unit of work that runs outside a graph node (e.g. a background ingestion job).
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    record = TraceRecord(name, trace_id or uuid.uuid4().hex)
+    token = _current.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record.error = repr(e)
+        raise
+    finally:
+        record.wall_ms = (time.perf_counter() - start) * 1000
+        _current.reset(token)
+        tracer.finish(record)
+
+
+def traced_node(name: str, node: Callable) -> Callable:
+    """
+    Wraps a graph node so each run produces a TraceRecord. The trace id comes from
+    config["configurable"]["trace_id"] (one per question), falling back to the thread id.
+    Returns the node itself when tracing is disabled.
+    """
+    if not TRACING_ENABLED:
+        return node
+
+    import inspect
+    passes_config = "config" in inspect.signature(node).parameters
+
+    def traced(state, config=None):
+        configurable = (config or {}).get("configurable", {})
+        trace_id = configurable.get("trace_id") or configurable.get("thread_id") or "-"
+        with trace_task(name, trace_id):
+            return node(state, config) if passes_config else node(state)
+
+    traced.__name__ = getattr(node, "__name__", name)
+    return traced
+
+
+# --- Prometheus endpoint ---
+
+_server_lock = threading.Lock()
+_server: Optional[ThreadingHTTPServer] = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = tracer.render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes every few seconds would flood the app log
+
+
+def start_metrics_server(port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """
+    Serves /metrics on `port` from a daemon thread; started at most once per process.
+    """
+    global _server
+    if not TRACING_ENABLED or not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e: # e.g. a second Streamlit process on the same port
+                logging.warning(f"Tracing: metrics endpoint not started on port {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+            logging.info(f"Tracing: Prometheus metrics on http://0.0.0.0:{port}/metrics")
+    return _server
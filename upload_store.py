@@ -0,0 +1,136 @@
+# upload_store.py
+# Content-addressed store for uploaded files. Bytes are hashed while they are written, so
+# an upload costs one pass instead of write + re-read; every distinct content is kept once
+# as <hash><suffix>, and least-recently-used files are removed once the store grows past
+# its size limit. Also home of the file hash used everywhere (collection names, caches).
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import BinaryIO, Optional, Tuple
+
+from config import FILE_HASH_ALGORITHM, HASH_BUFFER_SIZE, UPLOAD_STORE_DIR, UPLOAD_STORE_MAX_BYTES
+
+HASH_HEX_LENGTH = 32 # Longer digests are truncated, so doc_<hash> names keep their length
+
+
+class _XXH3Hasher:
+    # Optional `xxhash` package; by far the fastest option when installed
+    def __init__(self):
+        import xxhash
+        self._hasher = xxhash.xxh3_128()
+
+    def update(self, data) -> None:
+        self._hasher.update(data)
+
+    def hexdigest(self) -> str:
+        return self._hasher.hexdigest()
+
+
+def new_hasher(algorithm: str = FILE_HASH_ALGORITHM):
+    if algorithm == "xxh3":
+        return _XXH3Hasher()
+    if algorithm not in ("md5", "sha1", "sha256", "blake2b"):
+        raise ValueError(f"Unsupported file hash algorithm '{algorithm}' (use md5, sha1, sha256, blake2b or xxh3)")
+    return hashlib.new(algorithm)
+
+
+def hexdigest(hasher) -> str:
+    return hasher.hexdigest()[:HASH_HEX_LENGTH]
+
+
+def hash_file(file_path: str, algorithm: str = FILE_HASH_ALGORITHM) -> str:
+    hasher = new_hasher(algorithm)
+    buffer = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer) # Reuses one buffer instead of allocating a bytes object per read
+            if not read:
+                break
+            hasher.update(view[:read])
+    return hexdigest(hasher)
+
+
+class UploadStore:
+    """
+    Files are named by content hash, so re-uploading the same bytes (from any session) reuses
+    the existing copy. Access time marks use (see touch()); the most recently stored file
+    is never evicted.
+    """
+
+    def __init__(self, directory: str = UPLOAD_STORE_DIR, max_bytes: int = UPLOAD_STORE_MAX_BYTES, algorithm: str = FILE_HASH_ALGORITHM):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.algorithm = algorithm
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, file_hash: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{file_hash}{suffix.lower()}")
+
+    def store(self, stream: BinaryIO, suffix: str) -> Tuple[str, str]:
+        """
+        Copies `stream` into the store, hashing it on the way. Returns (path, file_hash).
+        """
+        hasher = new_hasher(self.algorithm)
+        partial_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.partial")
+        try:
+            with open(partial_path, "wb") as f:
+                while True:
+                    chunk = stream.read(HASH_BUFFER_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    f.write(chunk)
+            file_hash = hexdigest(hasher)
+            path = self.path_for(file_hash, suffix)
+            with self._lock:
+                if os.path.exists(path):
+                    os.remove(partial_path) # Same content already stored: keep the existing copy (and its mtime)
+                    self.touch(path)
+                    logging.info(f"Upload store: '{path}' already stored.")
+                else:
+                    os.replace(partial_path, path)
+                    logging.info(f"Upload store: stored '{path}'.")
+                self._evict(keep=path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        return path, file_hash
+
+    def touch(self, path: str) -> None:
+        # Only the access time changes: upload() uses size + mtime to spot an unchanged file
+        try:
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.startswith("."): # In-progress copies
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_atime_ns, stat.st_size, path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            logging.info(f"Upload store: evicted '{path}'")
@@ -1,17 +1,72 @@
 # vqa_tool.py (Updated to use PaddleOCR's predict() method)
 
 from PIL import Image
+import logging
 import os
-import re
-from typing import Dict, Any
-from dotenv import load_dotenv
-load_dotenv()
-# --- PaddleOCR Imports and Initialization ---
-from paddleocr import PaddleOCR
-from langchain_groq import ChatGroq
-
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-llm = ChatGroq(model="deepseek-r1-distill-llama-70b", api_key=GROQ_API_KEY)  # Or use "llama3-70b-8192" etc.
+import threading
+from typing import Dict, Any, List
+from langchain.schema import Document
+
+from bm25_index import BM25Index, bm25_index_path
+from config import OCR_INLINE_TOKEN_BUDGET, OCR_LINES_PER_CHUNK, OCR_RETRIEVAL_K
+from context_assembler import count_tokens
+from ingestion import ingest_documents
+from ocr_cache import run_ocr
+from resources import drop_vectorstore, finish_vectorstore, get_bm25_index, get_embeddings, get_llm, get_vectorstore, prepare_vectorstore, registry, vectorstore_exists
+from retrieval import hybrid_search
+from streaming import stream_answer
+from tracing import active, count, span
+
+
+_ocr_index_lock = threading.Lock()
+
+
+def ocr_line_chunks(ocr_result: Dict[str, List]) -> List[Document]:
+    # Small groups of consecutive lines (reading order), each with the position of its first line
+    texts, boxes, scores = ocr_result["rec_texts"], ocr_result.get("rec_boxes") or [], ocr_result.get("rec_scores") or []
+    chunks = []
+    for start in range(0, len(texts), OCR_LINES_PER_CHUNK):
+        end = min(start + OCR_LINES_PER_CHUNK, len(texts))
+        box = boxes[start] if start < len(boxes) else [0, 0, 0, 0]
+        chunks.append(Document(
+            page_content="\n".join(texts[start:end]),
+            metadata={"line_start": start, "line_end": end - 1, "left": int(box[0]), "top": int(box[1]), "min_score": float(min(scores[start:end], default=1.0))},
+        ))
+    return chunks
+
+
+def relevant_ocr_text(question: str, ocr_result: Dict[str, List], content_hash: str) -> str:
+    """
+    For text-heavy images: indexes the OCR lines into an ocr_<hash> collection (once per image)
+    and returns only the line groups relevant to the question, in reading order.
+    """
+    collection_name = f"ocr_{content_hash}"
+    with _ocr_index_lock:
+        if not vectorstore_exists(collection_name):
+            lexical_index = BM25Index()
+            try:
+                vectordb = prepare_vectorstore(collection_name)
+                ingest_documents(ocr_line_chunks(ocr_result), vectordb, split=False, lexical_index=lexical_index)
+                finish_vectorstore(collection_name, vectordb)
+            except BaseException:
+                drop_vectorstore(collection_name) # Never leave a half-built collection behind
+                raise
+            lexical_index.save(bm25_index_path(collection_name))
+            registry.put(f"bm25:{collection_name}", lexical_index)
+            logging.info(f"VQA: indexed {len(ocr_result['rec_texts'])} OCR lines into '{collection_name}'.")
+
+    with span("embed_query"):
+        query_embedding = get_embeddings().embed_query(question)
+    with span("retrieval"):
+        top_docs, _ = hybrid_search(
+            get_vectorstore(collection_name),
+            question,
+            query_embedding,
+            get_bm25_index(collection_name),
+            k_final=OCR_RETRIEVAL_K,
+        )
+    top_docs.sort(key=lambda doc: doc.metadata.get("line_start", 0))
+    return "\n".join(doc.page_content for doc in top_docs)
 
 
 # --- VQA Tool Node (using OCR + LLM Placeholder) ---
@@ -23,13 +78,6 @@ def vqa_tool_node(state: Dict[str, Any]) -> Dict[str, Any]:
     for text extraction and an LLM placeholder for reasoning.
     """
     
-    print("Initializing PaddleOCR with default English models on CPU...")
-    ocr_engine = PaddleOCR(
-        use_angle_cls=True,           # Use angle classification to handle rotated text lines
-        lang="en"                # Language model
-    )
-    print("PaddleOCR engine initialized.")
-
     question = state.get("input", "")
     file_path = state.get("file_path", "")
 
@@ -42,12 +90,11 @@ def vqa_tool_node(state: Dict[str, Any]) -> Dict[str, Any]:
 
     try:
         print(f"Starting OCR for image: {file_path}")
-        # The .predict() method returns a comprehensive result dictionary. This automatically handles detection, cropping, and recognition.
-        ocr_result = ocr_engine.predict(file_path)
-        # print(f"OCR result: {ocr_result}")  #Contains [rec_texts] which is the desired output
-        extracted_texts = []
-        
-        extracted_texts = ocr_result[0]['rec_texts']
+        # Served from the on-disk OCR cache when this image (by content hash) was seen before;
+        # upload() already hashed the file, so reuse that hash instead of reading it again.
+        ocr_result = run_ocr(file_path, content_hash=state.get("last_processed_file_hash"))
+        extracted_texts = ocr_result['rec_texts']
+        count("ocr_lines", len(extracted_texts))
         print(f"OCR completed. Total extracted text lines: {len(extracted_texts)}")
 
         if len(extracted_texts) == 0:
@@ -59,6 +106,13 @@ def vqa_tool_node(state: Dict[str, Any]) -> Dict[str, Any]:
         if not full_extracted_text.strip():
             return {**state, "answer": "OCR found text regions but extracted no readable text."}
 
+        # Text-heavy images (long screenshots, scanned pages) would overflow the prompt:
+        # retrieve only the OCR lines relevant to the question instead
+        content_hash = state.get("last_processed_file_hash")
+        if content_hash and count_tokens(full_extracted_text) > OCR_INLINE_TOKEN_BUDGET:
+            full_extracted_text = relevant_ocr_text(question, ocr_result, content_hash)
+            count("ocr_retrieved")
+
         print(f"OCR extracted text (first 100 chars): '{full_extracted_text[:100]}...'")
 
         # 2. Formulate a prompt for the text-based LLM (RAG)
@@ -74,8 +128,10 @@ def vqa_tool_node(state: Dict[str, Any]) -> Dict[str, Any]:
 
         # 3. Send to LLM (Placeholder)
 
-        response = llm.invoke(rag_prompt)  # Using .invoke() for runnable
-        response_content = re.sub(r"<think>.*?</think>", "", response.content, flags=re.DOTALL).strip()
+        # Tokens are streamed to the UI as they arrive; <think> reasoning is filtered out on the fly
+        if active():
+            count("prompt_tokens", count_tokens(rag_prompt)) # stream_answer() counts the completion
+        response_content, _ = stream_answer(get_llm(), rag_prompt)
         return {**state, "answer": response_content}
 
     except Exception as e: